@@ -1,53 +1,419 @@
 #!/usr/bin/env python3
 """
 NSM Attestation Document Generator
+
+Usage:
+    python3 get_attestation.py --command attestation [--public-key <base64>] ...
+    python3 get_attestation.py --command random-stream --length <bytes> > seed.bin
+    python3 get_attestation.py --serve [--socket /tmp/nsm.sock] [--asyncio --workers 4]
+    python3 get_attestation.py --stdio
+    python3 get_attestation.py --serve --processes 4 [--nsm-concurrency 1]
+    python3 get_attestation.py --serve --metrics-port 9464
+    python3 get_attestation.py --command attestation --timings
+
+--serve 모드에서는 프로세스 하나가 계속 떠 있으면서 Unix domain socket으로
+줄 단위 JSON 요청({"command": "attestation", ...})을 받아 JSON 한 줄로 응답합니다.
+--stdio 모드는 같은 요청/응답을 stdin/stdout으로 주고받는 co-process입니다.
+요청은 병렬로 처리되므로 응답 순서가 바뀔 수 있고, 요청의 "id"가 응답에 그대로 붙습니다.
+--processes N 이면 supervisor가 socket을 bind 하고 N개의 worker process가 같은 socket에서
+accept 합니다 (GIL 우회). NSM 동시 호출 수는 worker 전체에서 --nsm-concurrency로 제한되고,
+죽은 worker는 supervisor가 다시 띄웁니다.
+
+출력 형식 (--format, socket daemon에서는 요청의 "format"):
+    json  기본값. binary 필드(document, random)는 base64 문자열
+    cbor  4-byte big-endian 길이 + CBOR map (binary 필드는 byte string 그대로)
+    raw   CLI 전용. 4-byte big-endian 길이 + document (또는 random) bytes
+
+NSM backend는 NSM_BACKEND 환경 변수로 고릅니다 (nitro | emulator | standin).
+NSM_DEVICE_SOCKET만 주면 nsm_standin.py의 로컬 stand-in 디바이스를 사용합니다.
+
+--timings (daemon에서는 요청의 "timings": true)를 주면 응답에 단계별 ns 시간이 붙습니다.
+    import_ns / open_ns / ioctl_ns / close_ns  NSM 모듈 import, 디바이스 open, NSM 호출, close
+    encode_ns   base64/JSON (또는 CBOR) 직렬화
+    script_ns   스크립트 첫 줄부터, process_ns  프로세스 시작부터 (clock tick 해상도, Linux)
+요청 안에서 일어나지 않은 단계는 빠집니다 (예: daemon은 디바이스를 열어둔 채 재사용).
+
+daemon 요청에 "deadline" (Unix epoch ms)을 주면 그 시각이 지난 요청은 NSM에 닿기 전에
+{"success": false, "expired": true}로 끝납니다. 대기 + 처리 중 요청이 --max-pending을 넘으면
+큐에 쌓지 않고 바로 {"success": false, "overloaded": true}를 돌려줍니다.
 """
 
+import time
+
+# --timings의 script_ns 기준점 (아래 import 시간까지 포함되도록 가장 먼저 기록)
+SCRIPT_START_NS = time.perf_counter_ns()
+
+import os
 import sys
 import json
+import atexit
 import base64
 import argparse
+import asyncio
+import contextlib
+import errno
+import fcntl
 import hashlib
-import time
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
-def get_attestation(public_key=None, user_data=None, nonce=None):
-    """NSM에서 attestation document 가져오기"""
+import merkle
+import nsm_cbor
+import nsm_metrics
+
+DEFAULT_SOCKET = '/tmp/nsm.sock'
+STDIO_WORKERS = 4
+ASYNC_WORKERS = 4
+# daemon이 동시에 받아두는 요청 수 상한 (대기 + 처리 중, --max-pending)
+MAX_PENDING = 256
+# asyncio daemon 요청 한 줄의 최대 크기 (StreamReader 기본 64 KiB로는 큰 merkle/batch 요청이 잘림)
+MAX_REQUEST_LINE = 16 * 1024 * 1024
+
+# NSM GetRandom 한 번에 받을 수 있는 최대 bytes
+NSM_MAX_RANDOM = 256
+# random-stream에서 미리 받아둘 chunk 수
+RANDOM_STREAM_DEPTH = 16
+
+# daemon metrics (--metrics-port 또는 "metrics" 명령으로 노출)
+metrics = nsm_metrics.Registry()
+REQUEST_SECONDS = metrics.histogram(
+    'nsm_request_duration_seconds', 'Request handling time by command, excluding response encoding')
+IOCTL_SECONDS = metrics.histogram(
+    'nsm_ioctl_duration_seconds', 'Time spent inside NSM device calls by operation')
+ENCODE_SECONDS = metrics.histogram(
+    'nsm_encode_duration_seconds', 'Response serialisation time by format')
+QUEUE_DEPTH = metrics.gauge('nsm_queue_depth', 'Calls waiting for the NSM device')
+IN_FLIGHT = metrics.gauge('nsm_requests_in_flight', 'Requests currently being handled')
+MOCK_FALLBACKS = metrics.counter(
+    'nsm_mock_fallbacks_total', 'Responses served from mock output because NSM was unavailable')
+REJECTED = metrics.counter(
+    'nsm_requests_rejected_total', 'Requests refused before reaching NSM, by reason')
+
+
+class PhaseTimings:
+    """요청 하나의 단계별 시간 (ns 누적)"""
+
+    _local = threading.local()
+
+    def __init__(self):
+        self.phases = {}
+
+    @classmethod
+    def current(cls):
+        return getattr(cls._local, 'timings', None)
+
+    @classmethod
+    def record(cls, phase, start_ns):
+        """현재 thread에서 수집 중이면 start_ns부터 지금까지를 phase에 더함"""
+        timings = getattr(cls._local, 'timings', None)
+        if timings is not None:
+            timings.phases[phase] = timings.phases.get(phase, 0) + time.perf_counter_ns() - start_ns
+
+    def __enter__(self):
+        self._previous = self.current()
+        PhaseTimings._local.timings = self
+        return self
+
+    def __exit__(self, *exc):
+        PhaseTimings._local.timings = self._previous
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """요청의 "deadline" (Unix epoch ms)
+
+    요청을 처리하는 thread에 걸어두고, NSM 호출 직전 (device lock을 잡은 뒤)에 check() 합니다.
+    deadline이 없는 요청은 제한 없음.
+    """
+
+    _local = threading.local()
+
+    def __init__(self, deadline_ms=None):
+        self.deadline_ms = None if deadline_ms is None else float(deadline_ms)
+
+    @classmethod
+    def remaining(cls):
+        """현재 요청의 남은 시간 (초, deadline이 없으면 None)"""
+        deadline = getattr(cls._local, 'deadline', None)
+        if deadline is None or deadline.deadline_ms is None:
+            return None
+        return deadline.deadline_ms / 1000 - time.time()
+
+    @classmethod
+    def check(cls):
+        remaining = cls.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f'Deadline exceeded by {-remaining * 1000:.0f} ms')
+
+    def __enter__(self):
+        self._previous = getattr(Deadline._local, 'deadline', None)
+        Deadline._local.deadline = self
+        return self
+
+    def __exit__(self, *exc):
+        Deadline._local.deadline = self._previous
+
+
+def process_elapsed_ns():
+    """프로세스 시작(인터프리터 초기화 포함)부터 지금까지 (Linux 외에는 None)"""
     try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])  # starttime (22번째 필드, 부팅 후 clock tick)
+        now_ns = time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+    except (OSError, IndexError, ValueError, AttributeError):
+        return None
+    return now_ns - start_ticks * 1_000_000_000 // os.sysconf('SC_CLK_TCK')
+
+
+def elapsed_totals():
+    return {
+        'script_ns': time.perf_counter_ns() - SCRIPT_START_NS,
+        'process_ns': process_elapsed_ns(),
+    }
+
+
+class NsmSlots:
+    """prefork worker process들이 공유하는 NSM 동시 호출 제한
+
+    슬롯 하나 = lock 파일의 1 byte에 대한 fcntl 레코드 lock입니다. 레코드 lock은 process 단위라
+    worker가 NSM 호출 도중 죽어도 OS가 풀어주므로 슬롯이 새지 않습니다.
+    process 안에서는 NsmHandle lock이 호출을 직렬화하므로 process당 최대 한 슬롯만 잡습니다.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self._file = tempfile.TemporaryFile()
+        self._held = None
+
+    def acquire(self):
+        for slot in range(self.limit):
+            try:
+                fcntl.lockf(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+            except OSError:
+                continue
+            self._held = slot
+            return
+        # 빈 슬롯이 없으면 process마다 다른 슬롯에서 대기
+        slot = os.getpid() % self.limit
+        fcntl.lockf(self._file, fcntl.LOCK_EX, 1, slot)
+        self._held = slot
+
+    def release(self):
+        fcntl.lockf(self._file, fcntl.LOCK_UN, 1, self._held)
+        self._held = None
+
+
+def nsm_backend_name():
+    """NSM_BACKEND 값 (없으면 NSM_DEVICE_SOCKET이 있을 때 standin, 아니면 nitro)"""
+    default = 'standin' if os.environ.get('NSM_DEVICE_SOCKET') else 'nitro'
+    return os.environ.get('NSM_BACKEND', default)
+
+
+def load_nsm_backend():
+    """NSM_BACKEND 환경 변수로 NSM 구현 선택
+
+    nitro (기본값)  aws_nsm_interface (/dev/nsm)
+    emulator       nsm_emulator (로컬 test root로 서명한 COSE_Sign1, NSM_EMULATOR_SEED로 결정적)
+    standin        nsm_standin (NSM_DEVICE_SOCKET의 stand-in 서버, 지연/오류 주입)
+    """
+    backend = nsm_backend_name()
+    if backend == 'nitro':
         import aws_nsm_interface as nsm
-        
-        # NSM 디바이스 열기
-        fd = nsm.open_nsm_device()
-        
-        # 요청 파라미터
-        kwargs = {}
-        if public_key:
-            kwargs['public_key'] = base64.b64decode(public_key)
-        if user_data:
-            kwargs['user_data'] = user_data.encode('utf-8') if isinstance(user_data, str) else user_data
-        if nonce:
-            kwargs['nonce'] = base64.b64decode(nonce)
-        
+    elif backend == 'emulator':
+        import nsm_emulator as nsm
+    elif backend == 'standin':
+        import nsm_standin as nsm
+    else:
+        raise ValueError(f'Unknown NSM_BACKEND: {backend}')
+    return nsm
+
+
+class NsmHandle:
+    """프로세스 안에서 공유하는 /dev/nsm 핸들
+
+    처음 사용할 때 한 번 열고 이후 요청은 같은 fd를 재사용합니다.
+    ioctl이 EBADF/EIO로 실패하면 디바이스를 다시 열고 한 번 재시도합니다.
+    """
+
+    REOPEN_ERRNOS = (errno.EBADF, errno.EIO)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nsm = None
+        self._fd = None
+        self._describe_info = None
+        self.reopen_count = 0
+        # prefork 모드에서 worker 사이에 공유하는 NsmSlots
+        self.slots = None
+
+    @property
+    def is_open(self):
+        return self._fd is not None
+
+    def _open(self):
+        start = time.perf_counter_ns()
+        try:
+            nsm = load_nsm_backend()
+        finally:
+            PhaseTimings.record('import_ns', start)
+        self._nsm = nsm
+
+        start = time.perf_counter_ns()
+        self._fd = nsm.open_nsm_device()
+        PhaseTimings.record('open_ns', start)
+        # 디바이스가 바뀌었을 수 있으므로 캐시된 describe 정보는 버림
+        self._describe_info = None
+
+    def _close(self):
+        if self._fd is None:
+            return
+        start = time.perf_counter_ns()
+        try:
+            self._nsm.close_nsm_device(self._fd)
+        except OSError:
+            pass
+        PhaseTimings.record('close_ns', start)
+        self._fd = None
+
+    def _invoke(self, fn):
+        start = time.perf_counter_ns()
+        try:
+            return fn(self._nsm, self._fd)
+        finally:
+            PhaseTimings.record('ioctl_ns', start)
+
+    def call(self, fn, op='other'):
+        """fn(nsm, fd) 실행 (NSM 호출은 lock으로 직렬화, lock 대기를 뺀 시간을 op별로 기록)"""
+        QUEUE_DEPTH.inc()
+        with self._lock:
+            slots = self.slots
+            if slots:
+                slots.acquire()
+            QUEUE_DEPTH.dec()
+            try:
+                # 기다리는 동안 caller가 포기했으면 NSM까지 가지 않음
+                Deadline.check()
+                start = time.perf_counter()
+                try:
+                    return self._call(fn)
+                finally:
+                    IOCTL_SECONDS.observe(time.perf_counter() - start, op=op)
+            finally:
+                if slots:
+                    slots.release()
+
+    def _call(self, fn):
+        if self._fd is None:
+            self._open()
+        try:
+            return self._invoke(fn)
+        except OSError as e:
+            if e.errno not in self.REOPEN_ERRNOS:
+                raise
+            self._close()
+            self.reopen_count += 1
+            print(f'[NSM] Device error ({e}), reopening (reopens: {self.reopen_count})',
+                  file=sys.stderr, flush=True)
+            self._open()
+            return self._invoke(fn)
+
+    def describe(self, refresh=False):
+        """DescribeNSM 결과 (정적 정보라 디바이스를 다시 열 때까지 캐시)
+
+        (info, cached) 튜플을 반환합니다.
+        """
+        info = self._describe_info
+        if info is not None and not refresh:
+            return info, True
+
+        def fetch(nsm, fd):
+            # lock 안에서 저장해야 중간에 reopen 된 디바이스 정보와 섞이지 않음
+            self._describe_info = nsm.describe_nsm(fd)
+            return self._describe_info
+
+        return self.call(fetch, 'describe'), False
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        return {'open': self.is_open, 'reopens': self.reopen_count,
+                'backend': nsm_backend_name()}
+
+
+nsm_handle = NsmHandle()
+atexit.register(nsm_handle.close)
+
+
+def get_attestation(public_key=None, user_data=None, nonce=None):
+    """NSM에서 attestation document 가져오기
+
+    잘못된 입력 (base64 오류 등)은 ValueError로 올라가고, NSM 오류는 mock으로 대체됩니다.
+    """
+    # 요청 파라미터
+    kwargs = {}
+    if public_key:
+        kwargs['public_key'] = base64.b64decode(public_key, validate=True)
+    if user_data:
+        kwargs['user_data'] = user_data.encode('utf-8') if isinstance(user_data, str) else user_data
+    if nonce:
+        kwargs['nonce'] = base64.b64decode(nonce, validate=True)
+
+    try:
         # Attestation 요청
-        attestation_doc = nsm.get_attestation_doc(fd, **kwargs)
-        
-        nsm.close_nsm_device(fd)
-        
-        return {
-            'success': True,
-            'document': base64.b64encode(attestation_doc).decode('utf-8'),
-            'pcrs': {},
-        }
-        
+        attestation_doc = nsm_handle.call(lambda nsm, fd: nsm.get_attestation_doc(fd, **kwargs),
+                                          'attestation')
+    except DeadlineExceeded:
+        raise
     except ImportError as e:
-        return mock_attestation(f'NSM library not available: {e}')
+        return mock_attestation(f'NSM library not available: {e}', **kwargs)
     except FileNotFoundError as e:
-        return mock_attestation(f'NSM device not found: {e}')
+        return mock_attestation(f'NSM device not found: {e}', **kwargs)
     except Exception as e:
-        return mock_attestation(f'NSM error: {e}')
+        return mock_attestation(f'NSM error: {e}', **kwargs)
+
+    result = {
+        'success': True,
+        'document': attestation_doc,
+        'pcrs': {},
+    }
+
+    # payload의 pcrs/module_id/timestamp만 추출 (certificate/cabundle은 건너뜀)
+    try:
+        fields = nsm_cbor.attestation_fields(attestation_doc)
+    except (ValueError, IndexError, struct.error) as e:
+        print(f'[NSM] Failed to decode attestation payload: {e}', file=sys.stderr, flush=True)
+        return result
+
+    result['pcrs'] = {str(idx): bytes(value).hex() for idx, value in fields.get('pcrs', {}).items()}
+    if 'module_id' in fields:
+        result['module_id'] = fields['module_id']
+    if 'timestamp' in fields:
+        result['timestamp'] = fields['timestamp']
+    return result
+
 
+def _b64_or_none(value):
+    return base64.b64encode(value).decode('utf-8') if value else None
 
-def mock_attestation(reason):
-    """Mock attestation 반환"""
+
+def mock_attestation(reason, public_key=None, user_data=None, nonce=None):
+    """Mock attestation 반환 (요청 필드는 base64로 문서에 포함)"""
+    MOCK_FALLBACKS.inc(command='attestation')
     mock_pcrs = {
         '0': hashlib.sha384(b'mock-pcr0').hexdigest(),
         '1': hashlib.sha384(b'mock-pcr1').hexdigest(),
@@ -58,70 +424,1326 @@ def mock_attestation(reason):
         'module_id': 'mock-module',
         'timestamp': int(time.time() * 1000),
         'pcrs': mock_pcrs,
+        'public_key': _b64_or_none(public_key),
+        'user_data': _b64_or_none(user_data),
+        'nonce': _b64_or_none(nonce),
     }
     
     return {
         'success': True,
-        'document': base64.b64encode(json.dumps(mock_doc).encode()).decode('utf-8'),
+        'document': json.dumps(mock_doc).encode(),
         'pcrs': mock_pcrs,
+        'module_id': mock_doc['module_id'],
+        'timestamp': mock_doc['timestamp'],
         'mock': True,
         'mock_reason': reason,
     }
 
 
+def get_attestation_batch(items):
+    """여러 attestation 요청을 한 번에 처리 (NSM 핸들 하나 공유)
+
+    항목별 실패는 해당 결과에만 기록하고 batch 전체는 계속 진행합니다.
+    """
+    results = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('item must be a JSON object')
+            result = get_attestation(item.get('public_key'), item.get('user_data'),
+                                     item.get('nonce'))
+        except (TypeError, ValueError) as e:
+            result = {'success': False, 'error': f'Invalid item: {e}'}
+        result['index'] = index
+        results.append(result)
+
+    return {
+        'success': True,
+        'count': len(results),
+        'failed': sum(1 for r in results if not r['success']),
+        'results': results,
+    }
+
+
+def get_merkle_attestation(payloads, public_key=None, nonce=None):
+    """commitment hash N개를 Merkle root 하나로 묶어 attestation 한 번으로 증명
+
+    user_data에 root(32 bytes)를 넣고, 각 payload에는 inclusion proof를 돌려줍니다.
+    검증: verify_attestation.py --commitment <hash> --proof <p1,p2,...>
+    """
+    if not payloads:
+        raise ValueError('payloads must not be empty')
+    leaves = [merkle.parse_hash(p) for p in payloads]
+    tree = merkle.MerkleTree(leaves)
+
+    result = get_attestation(public_key, tree.root, nonce)
+    result['root'] = merkle.to_hex(tree.root)
+    result['proofs'] = [
+        {'payload': merkle.to_hex(leaf), 'proof': [merkle.to_hex(p) for p in tree.proof(i)]}
+        for i, leaf in enumerate(leaves)
+    ]
+    return result
+
+
+def read_batch_items(stream):
+    """JSON 배열 또는 NDJSON 스트림에서 batch 항목 읽기"""
+    text = stream.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class NonceAggregator:
+    """짧은 window 동안 들어온 nonce들을 attestation 한 번으로 묶는 daemon용 aggregator
+
+    같은 (public_key, user_data)로 들어온 nonce들의 keccak256을 leaf로 Merkle tree를 만들고
+    root를 nonce로 attest 합니다. 각 요청자는 공유 document와 자기 nonce의 inclusion proof를
+    받습니다. 검증: verify_attestation.py --nonce <base64> --nonce-proof <p1,p2,...>
+    """
+
+    def __init__(self, window_ms):
+        self.window = window_ms / 1000
+        self._lock = threading.Lock()
+        self._pending = {}  # (public_key, user_data) -> [(leaf, Future)]
+
+    def enqueue(self, public_key, user_data, nonce):
+        """nonce를 현재 window의 batch에 넣고 기다리지 않고 Future를 반환
+
+        asyncio daemon은 이 Future를 event loop에서 기다려서 window 동안 executor thread를
+        잡지 않습니다 (thread에서 wait() 하면 한 window에 worker 수만큼만 묶임).
+        """
+        leaf = merkle.keccak256(base64.b64decode(nonce, validate=True))
+        future = Future()
+        key = (public_key, user_data)
+
+        with self._lock:
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = []
+                timer = threading.Timer(self.window, self._flush, args=(key,))
+                timer.daemon = True
+                timer.start()
+            batch.append((leaf, future))
+        return future
+
+    @staticmethod
+    def wait(future):
+        """현재 thread에서 요청 deadline까지 aggregation 결과를 기다림"""
+        try:
+            return future.result(timeout=Deadline.remaining())
+        except FutureTimeoutError:
+            raise DeadlineExceeded('Deadline exceeded waiting for nonce aggregation') from None
+
+    def _flush(self, key):
+        with self._lock:
+            batch = self._pending.pop(key)
+
+        try:
+            tree = merkle.MerkleTree([leaf for leaf, _ in batch])
+            result = get_attestation(key[0], key[1], base64.b64encode(tree.root).decode('utf-8'))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for index, (_, future) in enumerate(batch):
+            future.set_result(dict(
+                result,
+                nonce_root=merkle.to_hex(tree.root),
+                nonce_proof=[merkle.to_hex(p) for p in tree.proof(index)],
+                aggregated=len(batch),
+            ))
+
+
+# daemon 모드에서만 설정 (--aggregate-window-ms)
+nonce_aggregator = None
+
+
+class EntropyPool:
+    """NSM random bytes를 미리 받아두는 ring buffer (daemon용)
+
+    background thread가 fill level이 low-water 아래로 떨어지면 NSM에서 다시 채웁니다.
+    꺼낸 영역은 즉시 0으로 지워서 같은 bytes가 두 번 나가지 않게 하고,
+    fork 된 자식 프로세스에서는 pool 전체를 비웁니다.
+    """
+
+    REFILL_RETRY_DELAY = 1.0
+
+    def __init__(self, capacity=65536, low_water=None):
+        self.capacity = capacity
+        self.low_water = low_water if low_water is not None else capacity // 4
+        self._buf = bytearray(capacity)
+        self._start = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._need_refill = threading.Event()
+        self._thread = None
+        self.dry_count = 0
+        self.served_count = 0
+        os.register_at_fork(after_in_child=self._wipe)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._refill_loop, name='entropy-pool',
+                                        daemon=True)
+        self._thread.start()
+        self._need_refill.set()
+
+    def _wipe(self):
+        self._lock = threading.Lock()
+        self._buf[:] = bytes(self.capacity)
+        self._start = 0
+        self._size = 0
+        self._thread = None
+
+    def _put(self, chunk):
+        with self._lock:
+            chunk = chunk[:self.capacity - self._size]
+            end = (self._start + self._size) % self.capacity
+            first = min(len(chunk), self.capacity - end)
+            self._buf[end:end + first] = chunk[:first]
+            self._buf[:len(chunk) - first] = chunk[first:]
+            self._size += len(chunk)
+
+    def _refill_loop(self):
+        while True:
+            self._need_refill.wait()
+            self._need_refill.clear()
+            while self._size < self.capacity:
+                want = min(self.capacity - self._size, NSM_MAX_RANDOM)
+                try:
+                    chunk = nsm_handle.call(lambda nsm, fd: nsm.get_random(fd, want), 'random')
+                except Exception as e:
+                    print(f'[NSM] Entropy pool refill failed: {e}', file=sys.stderr, flush=True)
+                    time.sleep(self.REFILL_RETRY_DELAY)
+                    break
+                self._put(chunk)
+
+    def take(self, length):
+        """pool에서 length bytes 꺼내기 (부족하면 None)"""
+        with self._lock:
+            if length > self._size:
+                self.dry_count += 1
+                self._need_refill.set()
+                return None
+
+            first = min(length, self.capacity - self._start)
+            data = (bytes(self._buf[self._start:self._start + first])
+                    + bytes(self._buf[:length - first]))
+            # 꺼낸 영역은 지워서 재사용 방지
+            self._buf[self._start:self._start + first] = bytes(first)
+            self._buf[:length - first] = bytes(length - first)
+            self._start = (self._start + length) % self.capacity
+            self._size -= length
+            self.served_count += 1
+
+            if self._size < self.low_water:
+                self._need_refill.set()
+        return data
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'fill': self._size,
+            'served': self.served_count,
+            'dry': self.dry_count,
+        }
+
+
+# daemon 모드에서만 설정 (--entropy-pool-size)
+entropy_pool = None
+
+
+class AttestationCache:
+    """(public_key, user_data)별 attestation document LRU 캐시 (daemon용)
+
+    nonce가 없거나 allow_cached로 이전 document를 받아도 되는 요청에만 사용합니다.
+    max_age_ms보다 오래된 document는 버리고, max_entries를 넘으면 가장 오래 안 쓴 것부터 제거합니다.
+    """
+
+    def __init__(self, max_age_ms, max_entries=128):
+        self.max_age = max_age_ms / 1000
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (created, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, max_age_ms=None):
+        max_age = self.max_age if max_age_ms is None else min(self.max_age, max_age_ms / 1000)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry[0]
+                if age <= max_age:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[1], cached=True, age_ms=int(age * 1000))
+                if age > self.max_age:
+                    del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def age(self, key):
+        """key의 document 나이 (초, 없으면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else time.monotonic() - entry[0]
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# daemon 모드에서만 설정 (--cache-max-age-ms)
+attestation_cache = None
+
+
+class AttestationPrefetcher:
+    """nonce 없는 요청용 attestation document를 미리 만들어두는 queue (daemon용)
+
+    마지막으로 들어온 nonce 없는 요청의 (public_key, user_data)를 대상으로 background thread가
+    document를 depth개까지 채워두고, ttl_ms보다 오래된 것은 버립니다. 각 document는 한 번만 나갑니다.
+    nonce가 있는 요청은 (allow_cached여도) 사용하지 않습니다.
+
+    cache(--cache-max-age-ms)가 있으면 queue 대신 대상 key의 캐시 entry를 갱신합니다. 요청은
+    캐시에서 답하고, entry 나이가 max_age의 REFRESH_AT을 넘으면 만료 전에 새 document로 바꿔둡니다
+    (polling 부하와 상관없이 NSM 호출은 max_age당 약 한 번).
+    """
+
+    RETRY_DELAY = 1.0
+    REFRESH_AT = 0.5
+
+    def __init__(self, depth, ttl_ms, cache=None):
+        self.depth = depth
+        self.ttl = ttl_ms / 1000
+        self.cache = cache
+        self._queue = deque()  # (created, result)
+        self._target = None    # (public_key, user_data)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        threading.Thread(target=self._run, name='attestation-prefetch', daemon=True).start()
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        while self._queue and now - self._queue[0][0] > self.ttl:
+            self._queue.popleft()
+
+    def take(self, key, max_age_ms=None):
+        """key용 document를 queue에서 꺼내기 (없으면 None)
+
+        max_age_ms가 있으면 그보다 오래된 document는 꺼내지 않습니다 (queue에는 남겨둠).
+        """
+        with self._lock:
+            self._wakeup.set()
+            if key != self._target:
+                self.misses += 1
+                return None
+
+            self._evict_expired()
+            if not self._queue or (max_age_ms is not None and
+                                   time.monotonic() - self._queue[0][0] > max_age_ms / 1000):
+                self.misses += 1
+                return None
+
+            created, result = self._queue.popleft()
+            self.hits += 1
+        return dict(result, prefetched=True, age_ms=int((time.monotonic() - created) * 1000))
+
+    def retarget(self, key):
+        """요청 자신의 attestation이 성공한 뒤에 대상 key 변경 (잘못된 입력은 대상이 되지 않음)"""
+        with self._lock:
+            if key != self._target:
+                self._target = key
+                self._queue.clear()
+                self._wakeup.set()
+
+    def _needs_document(self, target):
+        if self.cache is not None:
+            age = self.cache.age(target)
+            return age is None or age >= self.cache.max_age * self.REFRESH_AT
+        return len(self._queue) < self.depth
+
+    def _run(self):
+        # 만료된 document도 다시 채우도록 주기적으로 깨어남
+        interval = self.ttl / 2 if self.cache is None else self.cache.max_age * self.REFRESH_AT / 2
+        while True:
+            self._wakeup.wait(timeout=interval)
+            self._wakeup.clear()
+            while True:
+                with self._lock:
+                    self._evict_expired()
+                    target = self._target
+                    if target is None or not self._needs_document(target):
+                        break
+
+                try:
+                    result = get_attestation(*target)
+                except Exception as e:
+                    print(f'[NSM] Attestation prefetch failed: {e}', file=sys.stderr, flush=True)
+                    time.sleep(self.RETRY_DELAY)
+                    break
+                if not result.get('success') or result.get('mock'):
+                    time.sleep(self.RETRY_DELAY)
+                    break
+
+                with self._lock:
+                    if self._target != target:
+                        continue
+                    if self.cache is not None:
+                        self.cache.put(target, _cache_entry(result))
+                    else:
+                        self._queue.append((time.monotonic(), result))
+
+    def stats(self):
+        return {'queued': len(self._queue), 'hits': self.hits, 'misses': self.misses}
+
+
+# daemon 모드에서만 설정 (--prefetch-depth)
+attestation_prefetcher = None
+
+
+def attest_request(request, defer_aggregation=False):
+    """daemon attestation 요청 처리: 캐시 → prefetch queue → nonce aggregation → NSM 순서
+
+    캐시와 prefetch를 같이 쓰면 prefetcher는 queue 대신 캐시 entry를 만료 전에 갱신하므로
+    nonce 없는 polling은 계속 캐시에서 답합니다. prefetch queue는 nonce 없는 요청에만 씁니다.
+    defer_aggregation이면 aggregation 결과를 기다리지 않고 Future를 반환합니다 (asyncio daemon).
+    """
+    public_key = request.get('public_key')
+    user_data = request.get('user_data')
+    nonce = request.get('nonce')
+    key = (public_key, user_data)
+    max_age_ms = request.get('max_age_ms')
+    max_age_ms = None if max_age_ms is None else float(max_age_ms)
+    cacheable = attestation_cache is not None and (not nonce or request.get('allow_cached'))
+
+    if cacheable:
+        cached = attestation_cache.get(key, max_age_ms)
+        if cached is not None:
+            return cached
+
+    result = None
+    if attestation_prefetcher and not nonce:
+        result = attestation_prefetcher.take(key, max_age_ms)
+        if result is not None:
+            return result
+
+    if nonce_aggregator and nonce:
+        future = nonce_aggregator.enqueue(public_key, user_data, nonce)
+        if cacheable:
+            future.add_done_callback(lambda f: f.exception() or _cache_result(key, f.result()))
+        return future if defer_aggregation else NonceAggregator.wait(future)
+
+    result = get_attestation(public_key, user_data, nonce)
+
+    if result.get('success') and not result.get('mock'):
+        if cacheable:
+            attestation_cache.put(key, _cache_entry(result))
+        if attestation_prefetcher and not nonce:
+            attestation_prefetcher.retarget(key)
+    return result
+
+
+# 응답마다 달라지는 필드 (캐시에는 document만 저장)
+# nonce_root/nonce_proof/aggregated는 aggregation에 참여한 요청자 한 명의 nonce에 대한 증명이므로
+# allow_cached로 같은 document를 받는 다른 요청자에게 넘어가면 안 됨
+_RESPONSE_ONLY_FIELDS = ('prefetched', 'age_ms', 'cached', 'nonce_root', 'nonce_proof', 'aggregated')
+
+
+def _cache_entry(result):
+    return {k: v for k, v in result.items() if k not in _RESPONSE_ONLY_FIELDS}
+
+
+def _cache_result(key, result):
+    if result.get('success') and not result.get('mock'):
+        attestation_cache.put(key, _cache_entry(result))
+
+
 def get_random(length=32):
-    """Secure random 생성"""
+    """Secure random 생성 (daemon에서는 entropy pool 우선)"""
+    if entropy_pool:
+        pooled = entropy_pool.take(length)
+        if pooled is not None:
+            return {
+                'success': True,
+                'random': pooled,
+                'length': length,
+            }
+
     try:
-        import aws_nsm_interface as nsm
-        fd = nsm.open_nsm_device()
-        random_bytes = nsm.get_random(fd, length)
-        nsm.close_nsm_device(fd)
+        random_bytes = nsm_handle.call(lambda nsm, fd: nsm.get_random(fd, length), 'random')
         return {
             'success': True,
-            'random': base64.b64encode(random_bytes).decode('utf-8'),
+            'random': random_bytes,
             'length': length,
         }
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        import os
+        MOCK_FALLBACKS.inc(command='random')
         return {
             'success': True,
-            'random': base64.b64encode(os.urandom(length)).decode('utf-8'),
+            'random': os.urandom(length),
             'length': length,
             'mock': True,
             'mock_reason': str(e),
         }
 
 
-def describe_nsm():
-    """NSM 정보 조회"""
+def _nsm_random_chunks(length, first):
+    """NSM random chunk generator (producer thread가 다음 chunk들을 미리 받아둠)"""
+    chunks = queue.Queue(maxsize=RANDOM_STREAM_DEPTH)
+    stop = threading.Event()
+
+    def produce():
+        remaining = length - len(first)
+        try:
+            while remaining > 0 and not stop.is_set():
+                want = min(remaining, NSM_MAX_RANDOM)
+                chunk = nsm_handle.call(lambda nsm, fd: nsm.get_random(fd, want), 'random')
+                if not chunk:
+                    raise OSError('NSM returned no random bytes')
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+                _put(chunk)
+            _put(None)
+        except Exception as e:
+            _put(e)
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    producer = threading.Thread(target=produce, name='random-stream', daemon=True)
+    producer.start()
     try:
-        import aws_nsm_interface as nsm
-        fd = nsm.open_nsm_device()
-        info = nsm.describe_nsm(fd)
-        nsm.close_nsm_device(fd)
-        return {'success': True, 'info': info}
+        yield first
+        while True:
+            item = chunks.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def _urandom_chunks(length):
+    for offset in range(0, length, NSM_MAX_RANDOM):
+        yield os.urandom(min(NSM_MAX_RANDOM, length - offset))
+
+
+def random_stream(length):
+    """대용량 random을 NSM 최대 크기 chunk 단위로 생성
+
+    (mock_reason, chunk iterator)를 반환합니다. NSM을 쓸 수 없으면 stream 전체를
+    os.urandom으로 대체하고 mock_reason을 채웁니다 (NSM과 섞지 않음).
+    """
+    if length <= 0:
+        return None, iter(())
+    try:
+        first = nsm_handle.call(
+            lambda nsm, fd: nsm.get_random(fd, min(length, NSM_MAX_RANDOM)), 'random')
     except Exception as e:
+        MOCK_FALLBACKS.inc(command='random-stream')
+        return str(e), _urandom_chunks(length)
+    return None, _nsm_random_chunks(length, first[:length])
+
+
+def describe_nsm(refresh=False):
+    """NSM 정보 조회 (refresh=True면 캐시 무시하고 다시 조회)"""
+    try:
+        info, cached = nsm_handle.describe(refresh)
+        return {'success': True, 'info': info, 'cached': cached}
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        MOCK_FALLBACKS.inc(command='describe')
         return {'success': False, 'error': str(e), 'mock': True}
 
 
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('utf-8')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _encode(response, fmt):
+    if fmt == 'cbor':
+        payload = nsm_cbor.dumps(response)
+        return struct.pack('>I', len(payload)) + payload
+    return json.dumps(response, default=_json_default).encode('utf-8') + b'\n'
+
+
+def encode_response(response, fmt='json'):
+    """응답 직렬화 (json: base64 필드가 있는 한 줄, cbor: 길이 prefix + CBOR envelope)
+
+    응답에 timings가 있으면 직렬화 시간을 encode_ns로 채워서 한 번 더 직렬화합니다.
+    """
+    start = time.perf_counter_ns()
+    encoded = _encode(response, fmt)
+    elapsed = time.perf_counter_ns() - start
+    ENCODE_SECONDS.observe(elapsed / 1e9, format=fmt)
+
+    timings = response.get('timings')
+    if isinstance(timings, dict):
+        response['timings'] = dict(timings, encode_ns=elapsed, **elapsed_totals())
+        encoded = _encode(response, fmt)
+    return encoded
+
+
+def response_format(request):
+    """요청의 "format" 필드 (socket daemon은 json/cbor만 지원)"""
+    fmt = request.get('format', 'json') if isinstance(request, dict) else 'json'
+    if fmt not in ('json', 'cbor'):
+        raise ValueError(f"Unsupported format '{fmt}' (use json or cbor)")
+    return fmt
+
+
+def with_request_id(response, request):
+    if isinstance(request, dict) and 'id' in request:
+        response['id'] = request['id']
+    return response
+
+
+class RequestLimiter:
+    """daemon 요청 admission (대기 + 처리 중인 요청 수 상한)
+
+    상한을 넘거나 deadline이 이미 지난 요청은 큐에 넣지 않고 바로 에러 응답을 돌려줘서
+    burst가 밀려 모든 요청이 timeout 나는 상황을 막습니다.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def admit(self, request):
+        """받을 수 있으면 None (끝나면 release() 호출), 아니면 바로 보낼 에러 응답"""
+        try:
+            expired = deadline_passed(request)
+        except (TypeError, ValueError) as e:
+            return with_request_id({'success': False, 'error': f'Invalid request: {e}'}, request)
+        if expired:
+            REJECTED.inc(reason='expired')
+            return with_request_id({'success': False, 'error': 'Deadline already passed',
+                                    'expired': True}, request)
+
+        with self._lock:
+            overloaded = self.pending >= self.max_pending
+            if not overloaded:
+                self.pending += 1
+        if overloaded:
+            REJECTED.inc(reason='overloaded')
+            return with_request_id({'success': False, 'overloaded': True,
+                                    'error': f'NSM daemon overloaded ({self.max_pending} pending)'},
+                                   request)
+        return None
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+
+# daemon 모드에서만 설정 (--max-pending)
+request_limiter = None
+
+
+def deadline_passed(request):
+    deadline = request.get('deadline') if isinstance(request, dict) else None
+    return deadline is not None and float(deadline) <= time.time() * 1000
+
+
+@contextlib.contextmanager
+def admitted(request):
+    """admission을 통과하면 None, 아니면 바로 보낼 에러 응답을 넘겨주는 context manager"""
+    if request_limiter is None:
+        yield None
+        return
+    rejected = request_limiter.admit(request)
+    if rejected is not None:
+        yield rejected
+        return
+    try:
+        yield None
+    finally:
+        request_limiter.release()
+
+
+COMMANDS = ('attestation', 'attestation-batch', 'attestation-merkle', 'random', 'random-stream',
+            'describe', 'stats', 'metrics')
+
+
+def handle_request(request, defer_aggregation=False):
+    """daemon 요청 하나 처리 (CLI와 같은 command 이름 사용)
+
+    defer_aggregation이면 nonce aggregation 요청은 결과 대신 Future를 반환하고,
+    호출자가 await_aggregation()으로 기다립니다.
+    """
+    if not isinstance(request, dict):
+        return {'success': False, 'error': 'Request must be a JSON object'}
+
+    command = request.get('command', 'attestation')
+    timings = PhaseTimings() if request.get('timings') else None
+    IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        with Deadline(request.get('deadline')), timings or contextlib.nullcontext():
+            result = dispatch_request(command, request, defer_aggregation)
+        if isinstance(result, Future):
+            return result
+        if timings is not None:
+            result = dict(result, timings=timings.phases)
+    except DeadlineExceeded as e:
+        REJECTED.inc(reason='expired')
+        result = {'success': False, 'error': str(e), 'expired': True}
+    except (TypeError, ValueError) as e:
+        result = {'success': False, 'error': f'Invalid request: {e}'}
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                command=command if command in COMMANDS else 'unknown')
+    return with_request_id(result, request)
+
+
+def dispatch_request(command, request, defer_aggregation=False):
+    try:
+        # executor 대기 중에 이미 지났으면 바로 끝냄
+        Deadline.check()
+        if command == 'attestation':
+            result = attest_request(request, defer_aggregation)
+        elif command == 'attestation-batch':
+            items = request.get('items')
+            if not isinstance(items, list):
+                raise ValueError("'items' must be a list")
+            result = get_attestation_batch(items)
+        elif command == 'attestation-merkle':
+            payloads = request.get('payloads')
+            if not isinstance(payloads, list):
+                raise ValueError("'payloads' must be a list")
+            result = get_merkle_attestation(payloads, request.get('public_key'),
+                                            request.get('nonce'))
+        elif command == 'random':
+            result = get_random(int(request.get('length', 32)))
+        elif command == 'random-stream':
+            result = {'success': False,
+                      'error': 'random-stream needs a binary channel (use --serve socket or CLI)'}
+        elif command == 'describe':
+            result = describe_nsm(bool(request.get('refresh')))
+        elif command == 'stats':
+            result = {'success': True, 'nsm': nsm_handle.stats()}
+            if entropy_pool:
+                result['entropy_pool'] = entropy_pool.stats()
+            if attestation_cache:
+                result['attestation_cache'] = attestation_cache.stats()
+            if attestation_prefetcher:
+                result['prefetch'] = attestation_prefetcher.stats()
+            if single_flight:
+                result['single_flight'] = single_flight.stats()
+        elif command == 'metrics':
+            result = {'success': True, 'metrics': metrics.render()}
+        else:
+            result = {'success': False, 'error': f'Unknown command: {command}'}
+    except (TypeError, ValueError) as e:
+        result = {'success': False, 'error': f'Invalid request: {e}'}
+    return result
+
+
+class NsmRequestHandler(socketserver.StreamRequestHandler):
+    """연결 하나에서 줄 단위 JSON 요청을 순서대로 처리"""
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self.respond({'success': False, 'error': f'Invalid JSON: {e}'})
+                continue
+
+            try:
+                fmt = response_format(request)
+            except ValueError as e:
+                self.respond(with_request_id({'success': False, 'error': str(e)}, request))
+                continue
+
+            with admitted(request) as rejected:
+                if rejected is not None:
+                    self.respond(rejected, fmt)
+                elif isinstance(request, dict) and request.get('command') == 'random-stream':
+                    if not self.stream_random(request):
+                        break
+                else:
+                    self.respond(handle_request(request), fmt)
+
+    def respond(self, response, fmt='json'):
+        self.wfile.write(encode_response(response, fmt))
+        self.wfile.flush()
+
+    def stream_random(self, request):
+        """JSON header 한 줄 뒤에 raw random bytes를 length 만큼 전송 (실패 시 False)"""
+        try:
+            length = int(request.get('length', 32))
+        except (TypeError, ValueError) as e:
+            self.respond({'success': False, 'error': f'Invalid request: {e}',
+                          'id': request.get('id')})
+            return True
+
+        mock_reason, chunks = random_stream(length)
+        header = {'success': True, 'length': length, 'stream': True}
+        if mock_reason:
+            header.update(mock=True, mock_reason=mock_reason)
+        if 'id' in request:
+            header['id'] = request['id']
+        self.respond(header)
+
+        # header를 보낸 뒤 실패하면 알릴 방법이 없으므로 연결을 끊음
+        try:
+            for chunk in chunks:
+                self.wfile.write(chunk)
+        except Exception as e:
+            print(f'[NSM] random-stream aborted: {e}', file=sys.stderr, flush=True)
+            return False
+        self.wfile.flush()
+        return True
+
+
+class NsmDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=DEFAULT_SOCKET, listener=None):
+    """Unix domain socket daemon 실행 (SIGTERM/SIGINT까지)
+
+    listener가 있으면 (prefork worker) supervisor가 bind 한 socket에서 accept만 합니다.
+    """
+    if listener is None:
+        # 이전 실행에서 남은 socket 파일 정리
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = NsmDaemon(socket_path, NsmRequestHandler)
+        os.chmod(socket_path, 0o600)
+    else:
+        server = NsmDaemon(socket_path, NsmRequestHandler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = listener
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f'[NSM] Daemon listening on {socket_path}', file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if listener is None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+async def await_aggregation(future, request):
+    """handle_request(defer_aggregation=True)가 넘긴 aggregation Future를 event loop에서 기다림"""
+    deadline = request.get('deadline')
+    timeout = None if deadline is None else max(0.0, float(deadline) / 1000 - time.time())
+    try:
+        # timeout으로 취소돼도 batch의 Future는 그대로 둬야 _flush가 결과를 넣을 수 있음
+        result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        REJECTED.inc(reason='expired')
+        return {'success': False, 'error': 'Deadline exceeded waiting for nonce aggregation',
+                'expired': True}
+    if request.get('timings'):
+        # NSM 호출은 aggregator timer thread에서 일어나므로 이 요청의 단계 시간은 없음
+        result = dict(result, timings={})
+    return result
+
+
+class SingleFlight:
+    """동시에 들어온 동일한 요청을 NSM 호출 하나로 합치는 asyncio용 coalescer
+
+    random은 요청마다 다른 bytes가 나가야 하므로 합치지 않습니다.
+    """
+
+    COMMANDS = ('attestation', 'describe')
+
+    def __init__(self, loop, executor):
+        self._loop = loop
+        self._executor = executor
+        self._inflight = {}  # request key -> asyncio.Future
+        self.coalesced_count = 0
+
+    async def _handle(self, request):
+        result = await self._loop.run_in_executor(self._executor, handle_request, request, True)
+        if isinstance(result, Future):
+            result = await await_aggregation(result, request)
+        return result
+
+    async def run(self, request):
+        command = request.get('command', 'attestation') if isinstance(request, dict) else None
+        if command not in self.COMMANDS:
+            return await self._loop.run_in_executor(self._executor, handle_request, request)
+
+        # deadline은 요청마다 다르므로 key에서 빼고, 먼저 온 요청의 deadline으로 실행
+        own = {k: v for k, v in request.items() if k != 'id'}
+        body = {k: v for k, v in own.items() if k != 'deadline'}
+        key = json.dumps(body, sort_keys=True)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._handle(own))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced_count += 1
+
+        # 한 waiter가 취소돼도 다른 waiter의 결과는 유지
+        result = dict(await asyncio.shield(future))
+        if result.get('expired') and not deadline_passed(request):
+            # 먼저 온 요청의 deadline만 지났으면 이 요청은 따로 실행
+            result = dict(await self._handle(own))
+        if 'id' in request:
+            result['id'] = request['id']
+        return result
+
+    def stats(self):
+        return {'inflight': len(self._inflight), 'coalesced': self.coalesced_count}
+
+
+# --serve --asyncio 에서만 설정
+single_flight = None
+
+
+def _cache_hit_ratio():
+    if not attestation_cache or not attestation_cache.hits + attestation_cache.misses:
+        return None
+    return attestation_cache.hits / (attestation_cache.hits + attestation_cache.misses)
+
+
+# scrape 시점에 daemon 구성 요소에서 읽는 값 (설정 안 된 구성 요소는 출력하지 않음)
+metrics.gauge_callback('nsm_requests_pending', 'Requests admitted and not yet answered',
+                       lambda: request_limiter and request_limiter.pending)
+metrics.counter_callback('nsm_device_reopens_total', 'NSM device reopens after EBADF/EIO',
+                         lambda: nsm_handle.reopen_count)
+metrics.gauge_callback('nsm_attestation_cache_hit_ratio', 'Attestation cache hits / lookups',
+                       _cache_hit_ratio)
+metrics.counter_callback(
+    'nsm_attestation_cache_lookups_total', 'Attestation cache lookups by result',
+    lambda: attestation_cache and [({'result': 'hit'}, attestation_cache.hits),
+                                   ({'result': 'miss'}, attestation_cache.misses)])
+metrics.gauge_callback('nsm_entropy_pool_fill_bytes', 'Bytes currently held in the entropy pool',
+                       lambda: entropy_pool and entropy_pool.stats()['fill'])
+metrics.gauge_callback('nsm_entropy_pool_capacity_bytes', 'Entropy pool capacity',
+                       lambda: entropy_pool and entropy_pool.capacity)
+metrics.gauge_callback('nsm_prefetch_queued', 'Pre-generated attestation documents waiting',
+                       lambda: attestation_prefetcher and attestation_prefetcher.stats()['queued'])
+metrics.counter_callback('nsm_single_flight_coalesced_total',
+                         'Requests answered by an identical in-flight request',
+                         lambda: single_flight and single_flight.coalesced_count)
+
+
+async def serve_async(socket_path=DEFAULT_SOCKET, workers=ASYNC_WORKERS, listener=None):
+    """asyncio Unix socket daemon (blocking NSM 호출은 bounded executor에서 실행)
+
+    listener가 있으면 (prefork worker) supervisor가 bind 한 socket에서 accept만 합니다.
+    """
+    global single_flight
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nsm')
+    single_flight = SingleFlight(loop, executor)
+
+    async def stream_random(request, writer):
+        try:
+            length = int(request.get('length', 32))
+        except (TypeError, ValueError) as e:
+            return {'success': False, 'error': f'Invalid request: {e}', 'id': request.get('id')}
+
+        mock_reason, chunks = await loop.run_in_executor(executor, random_stream, length)
+        header = {'success': True, 'length': length, 'stream': True}
+        if mock_reason:
+            header.update(mock=True, mock_reason=mock_reason)
+        if 'id' in request:
+            header['id'] = request['id']
+        writer.write(json.dumps(header).encode('utf-8') + b'\n')
+
+        try:
+            while True:
+                chunk = await loop.run_in_executor(executor, next, chunks, None)
+                if chunk is None:
+                    return None
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            # 중간에 끊겨도 producer thread 정리
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    async def handle_client(reader, writer):
+        try:
+            while True:
+                try:
+                    line = (await reader.readline()).strip()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # 줄 경계를 잃었으므로 오류를 알리고 연결을 닫음
+                    writer.write(encode_response(
+                        {'success': False,
+                         'error': f'Request line exceeds {MAX_REQUEST_LINE} bytes'}, 'json'))
+                    await writer.drain()
+                    break
+                if not line:
+                    if reader.at_eof():
+                        break
+                    continue
+                fmt = 'json'
+                request = None
+                try:
+                    request = json.loads(line)
+                    fmt = response_format(request)
+                except ValueError as e:
+                    response = with_request_id({'success': False, 'error': str(e)}, request)
+                else:
+                    with admitted(request) as rejected:
+                        if rejected is not None:
+                            response = rejected
+                        elif isinstance(request, dict) and request.get('command') == 'random-stream':
+                            response = await stream_random(request, writer)
+                        else:
+                            response = await single_flight.run(request)
+                if response is not None:
+                    writer.write(encode_response(response, fmt))
+                await writer.drain()
+        except (ConnectionError, OSError) as e:
+            print(f'[NSM] Client connection error: {e}', file=sys.stderr, flush=True)
+        finally:
+            writer.close()
+
+    if listener is None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(handle_client, path=socket_path,
+                                                 limit=MAX_REQUEST_LINE)
+        os.chmod(socket_path, 0o600)
+    else:
+        server = await asyncio.start_unix_server(handle_client, sock=listener,
+                                                 limit=MAX_REQUEST_LINE)
+
+    stop = loop.create_future()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, lambda: stop.done() or stop.set_result(None))
+
+    print(f'[NSM] Async daemon listening on {socket_path} ({workers} workers)',
+          file=sys.stderr, flush=True)
+    try:
+        async with server:
+            await stop
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if listener is None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+# 시작 직후 이 시간 안에 죽은 worker는 바로 다시 띄우지 않음 (crash loop 방지)
+WORKER_MIN_UPTIME = 1.0
+
+
+def serve_prefork(socket_path, processes, worker_main):
+    """supervisor: socket을 bind 하고 worker process를 fork, 죽은 worker는 다시 띄움
+
+    worker_main(listener, index)는 child process에서 실행됩니다 (NSM 디바이스/thread는 child에서 생성).
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    listener.listen(128)
+    # 여러 worker가 같은 연결에 깨어나도 accept에서 막히지 않도록
+    listener.setblocking(False)
+
+    children = {}  # pid -> (index, started)
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                worker_main(listener, index)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(processes):
+        spawn(index)
+    print(f'[NSM] Prefork supervisor listening on {socket_path} ({processes} workers)',
+          file=sys.stderr, flush=True)
+
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            entry = children.pop(pid, None)
+            if entry is None or stopping:
+                continue
+            index, started = entry
+            print(f'[NSM] Worker {index} (pid {pid}) exited with status {status}, restarting',
+                  file=sys.stderr, flush=True)
+            if time.monotonic() - started < WORKER_MIN_UPTIME:
+                time.sleep(WORKER_MIN_UPTIME)
+            if not stopping:
+                spawn(index)
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def serve_stdio(workers=STDIO_WORKERS):
+    """stdin에서 NDJSON 요청을 읽어 병렬 처리하고 stdout으로 응답 (EOF까지)"""
+    write_lock = threading.Lock()
+
+    # stdio는 NDJSON 채널이므로 항상 json
+    def respond(response):
+        line = encode_response(response)
+        with write_lock:
+            sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+
+    def process(request):
+        try:
+            respond(handle_request(request))
+        finally:
+            if request_limiter is not None:
+                request_limiter.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                respond({'success': False, 'error': f'Invalid JSON: {e}'})
+                continue
+            # executor 큐에 넣기 전에 admission (release는 process에서)
+            rejected = request_limiter.admit(request) if request_limiter is not None else None
+            if rejected is not None:
+                respond(rejected)
+            else:
+                executor.submit(process, request)
+
+
+def start_daemon_components(args, metrics_port=0):
+    """daemon 구성 요소 생성 (prefork에서는 worker마다 fork 뒤에 호출)"""
+    global nonce_aggregator, attestation_cache, attestation_prefetcher, entropy_pool
+    global request_limiter
+
+    if args.max_pending > 0:
+        request_limiter = RequestLimiter(args.max_pending)
+    if args.aggregate_window_ms > 0:
+        nonce_aggregator = NonceAggregator(args.aggregate_window_ms)
+    if args.cache_max_age_ms > 0:
+        attestation_cache = AttestationCache(args.cache_max_age_ms, args.cache_size)
+    if args.prefetch_depth > 0:
+        attestation_prefetcher = AttestationPrefetcher(args.prefetch_depth, args.prefetch_ttl_ms,
+                                                       attestation_cache)
+        attestation_prefetcher.start()
+    if args.entropy_pool_size > 0:
+        entropy_pool = EntropyPool(args.entropy_pool_size, args.entropy_low_water)
+        entropy_pool.start()
+    if metrics_port:
+        nsm_metrics.start_http_server(metrics, metrics_port)
+        print(f'[NSM] Metrics on http://127.0.0.1:{metrics_port}/metrics',
+              file=sys.stderr, flush=True)
+
+    # describe 정보는 시작할 때 한 번 받아둠
+    describe_nsm()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='NSM Attestation Tool')
-    parser.add_argument('--command', choices=['attestation', 'random', 'describe'], 
+    parser.add_argument('--command',
+                        choices=['attestation', 'attestation-batch', 'attestation-merkle',
+                                 'random', 'random-stream', 'describe'],
                         default='attestation')
     parser.add_argument('--public-key', help='Public key (base64)')
     parser.add_argument('--user-data', help='User data string')
     parser.add_argument('--nonce', help='Nonce (base64)')
     parser.add_argument('--length', type=int, default=32)
+    parser.add_argument('--format', choices=['json', 'cbor', 'raw'], default='json',
+                        help='Output format (raw: attestation/random only)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='describe: re-query the NSM instead of using cached info')
+    parser.add_argument('--input', default='-',
+                        help='attestation-batch/-merkle input: JSON array or NDJSON file '
+                             '(default: stdin)')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a persistent daemon on a Unix domain socket')
+    parser.add_argument('--socket', default=os.environ.get('NSM_SOCKET', DEFAULT_SOCKET),
+                        help=f'Daemon socket path (default: {DEFAULT_SOCKET})')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='Daemon: use the asyncio server with request coalescing')
+    parser.add_argument('--workers', type=int, default=ASYNC_WORKERS,
+                        help='Daemon (--asyncio): max concurrent blocking NSM calls '
+                             f'(default: {ASYNC_WORKERS})')
+    parser.add_argument('--processes', type=int,
+                        default=int(os.environ.get('NSM_PROCESSES', '0')),
+                        help='Daemon: pre-fork this many worker processes on the socket '
+                             '(0 = single process)')
+    parser.add_argument('--nsm-concurrency', type=int, default=1,
+                        help='Daemon: NSM calls allowed at once across all worker processes')
+    parser.add_argument('--stdio', action='store_true',
+                        help='Run as a co-process speaking NDJSON on stdin/stdout')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help='Daemon: answer "overloaded" once this many requests are queued or '
+                             f'running (default: {MAX_PENDING}, 0 = unlimited)')
+    parser.add_argument('--aggregate-window-ms', type=float, default=0,
+                        help='Daemon: batch nonces arriving within this window into one '
+                             'attestation (0 = disabled)')
+    parser.add_argument('--entropy-pool-size', type=int, default=0,
+                        help='Daemon: bytes of NSM randomness to keep prefetched (0 = disabled)')
+    parser.add_argument('--entropy-low-water', type=int,
+                        help='Daemon: refill the entropy pool below this many bytes '
+                             '(default: 1/4 of the pool)')
+    parser.add_argument('--cache-max-age-ms', type=float, default=0,
+                        help='Daemon: reuse documents per (public_key, user_data) for nonce-less '
+                             'or allow_cached requests up to this age (0 = disabled)')
+    parser.add_argument('--cache-size', type=int, default=128,
+                        help='Daemon: max cached attestation documents (LRU)')
+    parser.add_argument('--prefetch-depth', type=int, default=0,
+                        help='Daemon: keep this many fresh documents ready for nonce-less '
+                             'requests (0 = disabled; requests with a nonce never use them). '
+                             'With --cache-max-age-ms it refreshes the cache entry instead')
+    parser.add_argument('--prefetch-ttl-ms', type=float, default=30000,
+                        help='Daemon: drop prefetched documents older than this')
+    parser.add_argument('--timings', action='store_true',
+                        help='Report per-phase nanosecond timings in the output')
+    parser.add_argument('--metrics-port', type=int,
+                        default=int(os.environ.get('NSM_METRICS_PORT', '0')),
+                        help='Daemon: serve Prometheus metrics on 127.0.0.1:<port>/metrics '
+                             '(0 = disabled; the "metrics" command works either way)')
     
     args = parser.parse_args()
+
+    if args.serve or args.stdio:
+        if args.processes > 0 and args.stdio:
+            # NSM_PROCESSES 환경 변수가 co-process에도 상속될 수 있으므로 에러 대신 경고
+            print('[NSM] --processes is ignored in --stdio mode', file=sys.stderr, flush=True)
+        elif args.processes > 0:
+            nsm_handle.slots = NsmSlots(args.nsm_concurrency)
+
+            def worker_main(listener, index):
+                # worker마다 metrics port를 하나씩 씀 (metrics-port + index)
+                start_daemon_components(args, args.metrics_port and args.metrics_port + index)
+                if args.asyncio:
+                    asyncio.run(serve_async(args.socket, args.workers, listener))
+                else:
+                    serve(args.socket, listener)
+
+            serve_prefork(args.socket, args.processes, worker_main)
+            sys.exit(0)
+
+        start_daemon_components(args, args.metrics_port)
+        if args.serve and args.asyncio:
+            asyncio.run(serve_async(args.socket, args.workers))
+        elif args.serve:
+            serve(args.socket)
+        else:
+            serve_stdio()
+        sys.exit(0)
     
-    if args.command == 'attestation':
-        result = get_attestation(args.public_key, args.user_data, args.nonce)
-    elif args.command == 'random':
-        result = get_random(args.length)
-    elif args.command == 'describe':
-        result = describe_nsm()
-    else:
-        result = {'error': 'Unknown command'}
+    # random-stream은 JSON 대신 raw bytes를 stdout으로 출력
+    if args.command == 'random-stream':
+        mock_reason, chunks = random_stream(args.length)
+        if mock_reason:
+            print(f'[NSM] Warning: NSM unavailable, streaming os.urandom ({mock_reason})',
+                  file=sys.stderr)
+        out = sys.stdout.buffer
+        for chunk in chunks:
+            out.write(chunk)
+        out.flush()
+        sys.exit(0)
     
-    print(json.dumps(result))
+    # one-shot CLI도 daemon과 같은 요청 처리 경로 사용
+    request = {
+        'command': args.command,
+        'public_key': args.public_key,
+        'user_data': args.user_data,
+        'nonce': args.nonce,
+        'length': args.length,
+        'refresh': args.refresh,
+        'timings': args.timings,
+    }
+    try:
+        if args.command in ('attestation-batch', 'attestation-merkle'):
+            if args.input == '-':
+                items = read_batch_items(sys.stdin)
+            else:
+                with open(args.input, 'r') as f:
+                    items = read_batch_items(f)
+            request['items' if args.command == 'attestation-batch' else 'payloads'] = items
+        result = handle_request(request)
+    except ValueError as e:
+        result = {'success': False, 'error': f'Invalid input: {e}'}
+
+    if args.timings and 'timings' in result:
+        # one-shot은 출력 전에 디바이스를 닫아서 close 시간도 포함
+        with PhaseTimings() as closing:
+            nsm_handle.close()
+        result['timings'].update(closing.phases)
+    
+    if args.format == 'raw':
+        field = {'attestation': 'document', 'random': 'random'}.get(args.command)
+        if field is None or not result.get('success'):
+            error = result.get('error') or f'raw format is not supported for {args.command}'
+            print(json.dumps({'success': False, 'error': error}), file=sys.stderr)
+            sys.exit(1)
+        if result.get('mock'):
+            print(f"[NSM] Warning: mock output ({result.get('mock_reason')})", file=sys.stderr)
+        data = result[field]
+        sys.stdout.buffer.write(struct.pack('>I', len(data)) + data)
+        if 'timings' in result:
+            print(json.dumps({'timings': dict(result['timings'], **elapsed_totals())}),
+                  file=sys.stderr)
+    else:
+        sys.stdout.buffer.write(encode_response(result, args.format))
+    sys.stdout.buffer.flush()
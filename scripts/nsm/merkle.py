@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Keccak256 Merkle Tree
+
+src/shared/crypto.ts의 MerkleTree와 같은 규칙으로 root/proof를 계산합니다.
+- 부모 = keccak256(min(a, b) || max(a, b))  (sorted pair)
+- 홀수 개인 layer의 마지막 노드는 자기 자신과 짝을 이룸
+
+TS getProof()는 짝이 없는 마지막 노드의 sibling을 빼버리지만, 여기서는 자기 자신을
+sibling으로 넣어서 MerkleTree.verifyProof()로 모든 leaf가 검증되게 합니다.
+"""
+
+try:
+    from Crypto.Hash import keccak as _keccak
+
+    def keccak256(data: bytes) -> bytes:
+        return _keccak.new(digest_bits=256, data=data).digest()
+
+except ImportError:
+    # pycryptodome 없을 때 순수 Python 구현 (느리지만 동일한 결과)
+    _RC = [
+        0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+        0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+        0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+        0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+        0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+        0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+    ]
+    _ROT = [
+        [0, 36, 3, 41, 18],
+        [1, 44, 10, 45, 2],
+        [62, 6, 43, 15, 61],
+        [28, 55, 25, 21, 56],
+        [27, 20, 39, 8, 14],
+    ]
+    _MASK = (1 << 64) - 1
+    _RATE = 136
+
+    def _rol(x, n):
+        return ((x << n) | (x >> (64 - n))) & _MASK if n else x
+
+    def _keccak_f(a):
+        for rc in _RC:
+            c = [a[x][0] ^ a[x][1] ^ a[x][2] ^ a[x][3] ^ a[x][4] for x in range(5)]
+            d = [c[(x - 1) % 5] ^ _rol(c[(x + 1) % 5], 1) for x in range(5)]
+            a = [[a[x][y] ^ d[x] for y in range(5)] for x in range(5)]
+            b = [[0] * 5 for _ in range(5)]
+            for x in range(5):
+                for y in range(5):
+                    b[y][(2 * x + 3 * y) % 5] = _rol(a[x][y], _ROT[x][y])
+            a = [[b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y]) for y in range(5)]
+                 for x in range(5)]
+            a[0][0] ^= rc
+        return a
+
+    def keccak256(data: bytes) -> bytes:
+        padded = bytearray(data)
+        padded.append(0x01)
+        padded.extend(b'\x00' * (-len(padded) % _RATE))
+        padded[-1] |= 0x80
+
+        a = [[0] * 5 for _ in range(5)]
+        for offset in range(0, len(padded), _RATE):
+            block = padded[offset:offset + _RATE]
+            for i in range(_RATE // 8):
+                a[i % 5][i // 5] ^= int.from_bytes(block[i * 8:i * 8 + 8], 'little')
+            a = _keccak_f(a)
+
+        return b''.join(a[i % 5][i // 5].to_bytes(8, 'little') for i in range(4))
+
+
+def _hash_pair(a: bytes, b: bytes) -> bytes:
+    return keccak256(a + b) if a < b else keccak256(b + a)
+
+
+def parse_hash(value) -> bytes:
+    """'0x' 접두사가 있거나 없는 32 bytes hex 문자열을 bytes로 변환"""
+    if not isinstance(value, str):
+        raise ValueError(f'hash must be a hex string, got {type(value).__name__}')
+    raw = bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    if len(raw) != 32:
+        raise ValueError(f'hash must be 32 bytes, got {len(raw)}')
+    return raw
+
+
+def to_hex(value: bytes) -> str:
+    return '0x' + value.hex()
+
+
+class MerkleTree:
+    """sorted-pair keccak256 Merkle tree (leaf는 32 bytes)"""
+
+    def __init__(self, leaves):
+        self.layers = [list(leaves)]
+        while len(self.layers[-1]) > 1:
+            layer = self.layers[-1]
+            self.layers.append([
+                _hash_pair(layer[i], layer[i + 1] if i + 1 < len(layer) else layer[i])
+                for i in range(0, len(layer), 2)
+            ])
+
+    @property
+    def root(self) -> bytes:
+        if not self.layers[0]:
+            return b'\x00' * 32
+        return self.layers[-1][0]
+
+    def proof(self, index: int):
+        proof = []
+        for layer in self.layers[:-1]:
+            sibling = index + 1 if index % 2 == 0 else index - 1
+            proof.append(layer[sibling] if sibling < len(layer) else layer[index])
+            index //= 2
+        return proof
+
+
+def verify_proof(leaf: bytes, proof, root: bytes) -> bool:
+    """MerkleTree.verifyProof()와 같은 검증"""
+    computed = leaf
+    for element in proof:
+        computed = _hash_pair(computed, element)
+    return computed == root
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Minimal CBOR (RFC 8949) encoder / partial decoder
+
+get_attestation.py의 binary 출력(--format cbor)과 attestation document의 일부 필드 추출용입니다.
+enclave 이미지에 cbor2가 없어도 동작하도록 필요한 타입만 직접 처리합니다
+(None/bool/int/float/bytes/str/list/dict, definite-length만).
+"""
+
+import struct
+
+
+def _head(major, value):
+    if value < 24:
+        return bytes([major << 5 | value])
+    if value < 0x100:
+        return bytes([major << 5 | 24, value])
+    if value < 0x10000:
+        return struct.pack('>BH', major << 5 | 25, value)
+    if value < 0x100000000:
+        return struct.pack('>BI', major << 5 | 26, value)
+    return struct.pack('>BQ', major << 5 | 27, value)
+
+
+def _encode(obj, out):
+    if obj is None:
+        out.append(0xf6)
+    elif obj is True:
+        out.append(0xf5)
+    elif obj is False:
+        out.append(0xf4)
+    elif isinstance(obj, int):
+        out += _head(0, obj) if obj >= 0 else _head(1, -1 - obj)
+    elif isinstance(obj, float):
+        out += struct.pack('>Bd', 0xfb, obj)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        out += _head(2, len(obj))
+        out += obj
+    elif isinstance(obj, str):
+        encoded = obj.encode('utf-8')
+        out += _head(3, len(encoded))
+        out += encoded
+    elif isinstance(obj, (list, tuple)):
+        out += _head(4, len(obj))
+        for item in obj:
+            _encode(item, out)
+    elif isinstance(obj, dict):
+        out += _head(5, len(obj))
+        for key, value in obj.items():
+            _encode(key, out)
+            _encode(value, out)
+    else:
+        raise TypeError(f'Cannot CBOR-encode {type(obj).__name__}')
+
+
+def dumps(obj) -> bytes:
+    out = bytearray()
+    _encode(obj, out)
+    return bytes(out)
+
+
+# ============================================================================
+# Decoding
+# ============================================================================
+
+def _read_head(data, offset):
+    """(major, info, value, 다음 offset) 반환. value는 길이/정수값"""
+    initial = data[offset]
+    major, info = initial >> 5, initial & 0x1f
+    offset += 1
+    if info < 24:
+        return major, info, info, offset
+    if info == 24:
+        return major, info, data[offset], offset + 1
+    if info == 25:
+        return major, info, struct.unpack_from('>H', data, offset)[0], offset + 2
+    if info == 26:
+        return major, info, struct.unpack_from('>I', data, offset)[0], offset + 4
+    if info == 27:
+        return major, info, struct.unpack_from('>Q', data, offset)[0], offset + 8
+    raise ValueError(f'Unsupported CBOR additional info {info} at offset {offset - 1}')
+
+
+def skip(data, offset):
+    """항목 하나를 디코딩하지 않고 건너뛰기 (byte/text string은 길이만 보고 점프)"""
+    major, info, value, offset = _read_head(data, offset)
+    if major in (2, 3):
+        return offset + value
+    if major == 4:
+        for _ in range(value):
+            offset = skip(data, offset)
+    elif major == 5:
+        for _ in range(value * 2):
+            offset = skip(data, offset)
+    elif major == 6:
+        offset = skip(data, offset)
+    return offset
+
+
+def decode(data, offset=0):
+    """항목 하나를 디코딩해서 (value, 다음 offset) 반환"""
+    major, info, value, offset = _read_head(data, offset)
+    if major == 0:
+        return value, offset
+    if major == 1:
+        return -1 - value, offset
+    if major == 2:
+        return bytes(data[offset:offset + value]), offset + value
+    if major == 3:
+        return bytes(data[offset:offset + value]).decode('utf-8'), offset + value
+    if major == 4:
+        items = []
+        for _ in range(value):
+            item, offset = decode(data, offset)
+            items.append(item)
+        return items, offset
+    if major == 5:
+        result = {}
+        for _ in range(value):
+            key, offset = decode(data, offset)
+            result[key], offset = decode(data, offset)
+        return result, offset
+    if major == 6:
+        return decode(data, offset)  # tag는 무시
+    if info in (20, 21):
+        return info == 21, offset
+    if info in (22, 23):
+        return None, offset
+    if info == 26:
+        return struct.unpack_from('>f', data, offset - 4)[0], offset
+    if info == 27:
+        return struct.unpack_from('>d', data, offset - 8)[0], offset
+    raise ValueError(f'Unsupported CBOR simple value {info}')
+
+
+def loads(data):
+    return decode(memoryview(data))[0]
+
+
+def attestation_fields(document, wanted=('module_id', 'timestamp', 'pcrs')):
+    """COSE_Sign1 attestation document payload에서 wanted 필드만 디코딩
+
+    certificate/cabundle 같은 큰 필드는 길이만 보고 건너뛰므로 전체 디코딩보다 훨씬 쌉니다.
+    """
+    data = memoryview(document)
+    major, _, length, offset = _read_head(data, 0)
+    if major == 6:  # COSE_Sign1 tag (18)
+        major, _, length, offset = _read_head(data, offset)
+    if major != 4 or length != 4:
+        raise ValueError('Not a COSE_Sign1 structure')
+
+    offset = skip(data, offset)  # protected header
+    offset = skip(data, offset)  # unprotected header
+    major, _, length, offset = _read_head(data, offset)
+    if major != 2:
+        raise ValueError('COSE_Sign1 payload is not a byte string')
+    payload = data[offset:offset + length]
+
+    major, _, count, offset = _read_head(payload, 0)
+    if major != 5:
+        raise ValueError('Attestation payload is not a map')
+
+    fields = {}
+    for _ in range(count):
+        key, offset = decode(payload, offset)
+        if key in wanted:
+            fields[key], offset = decode(payload, offset)
+            if len(fields) == len(wanted):
+                break
+        else:
+            offset = skip(payload, offset)
+    return fields
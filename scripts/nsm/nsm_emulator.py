@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+NSM Emulator
+
+Nitro 하드웨어 없이 구조적으로 실제와 같은 attestation document를 만드는 NSM backend입니다.
+- COSE_Sign1 (protected {1: -35}, ES384 서명 96 bytes r||s)
+- 로컬 test root에서 시작하는 ECDSA P-384 인증서 체인 (root + 3 intermediates + leaf)
+- 48 bytes PCR 16개, 실제와 같은 payload 필드 순서
+
+aws_nsm_interface와 같은 함수(open_nsm_device, get_attestation_doc, get_random, describe_nsm,
+extend_pcr, lock_pcr, describe_pcr, close_nsm_device)를 제공하므로 get_attestation.py에서
+NSM_BACKEND=emulator 로 선택할 수 있습니다. NSM_EMULATOR_SEED를 주면 키/인증서/document/random이
+모두 seed로 결정됩니다 (timestamp도 고정 epoch에서 document마다 1ms씩 증가).
+
+Usage:
+    python3 nsm_emulator.py --seed ci --export-root emulator-root.pem
+    python3 nsm_emulator.py --seed bench --bench 10000
+
+검증: verify_attestation.py <hex> --root-cert emulator-root.pem
+"""
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+import datetime
+import threading
+
+import nsm_cbor
+
+try:
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+except ImportError as e:  # pragma: no cover - 설치 안내만
+    raise ImportError(f'NSM emulator requires the cryptography package ({e}). '
+                      'Run: pip3 install cryptography') from e
+
+# P-384 group order
+_P384_ORDER = int(
+    'ffffffffffffffffffffffffffffffffffffffffffffffffc7634d81f4372ddf'
+    '581a0db248b0a77aecec196accc52973', 16)
+
+# seed 모드의 기준 시각 (2025-01-01T00:00:00Z)
+DEFAULT_EPOCH_MS = 1735689600000
+REGION = 'us-east-1'
+PCR_COUNT = 16
+PCR_SIZE = 48
+MAX_PCRS = 32
+# 인증서 유효기간 (epoch 기준, 일)
+CERT_VALIDITY_DAYS = 365 * 50
+
+
+class NsmEmulator:
+    """결정적(seed) 또는 무작위 키로 동작하는 NSM emulator 인스턴스"""
+
+    def __init__(self, seed=None, epoch_ms=DEFAULT_EPOCH_MS):
+        self.seed = seed.encode('utf-8') if isinstance(seed, str) else seed
+        self.deterministic = self.seed is not None
+        self._lock = threading.Lock()
+        self._doc_counter = 0
+        self._random_counter = 0
+        self._epoch_ms = epoch_ms if self.deterministic else int(time.time() * 1000)
+
+        instance_id = self._derive(b'instance').hex()[:17]
+        self.module_id = f'i-{instance_id}-enc{self._derive(b"enclave").hex()[:16]}'
+        self.pcrs = [bytes(PCR_SIZE)] * MAX_PCRS
+        for index in (0, 1, 2, 3, 4, 8):
+            self.pcrs[index] = self._derive(b'pcr%d' % index)[:PCR_SIZE]
+        self.locked_pcrs = set()
+
+        self._protected = nsm_cbor.dumps({1: -35})  # alg: ES384
+        self._build_chain()
+
+    # ------------------------------------------------------------------
+    # Key / certificate chain
+    # ------------------------------------------------------------------
+
+    def _derive(self, label):
+        if not self.deterministic:
+            return os.urandom(48)
+        return hashlib.sha384(self.seed + b'/' + label).digest()
+
+    def _private_key(self, label):
+        if not self.deterministic:
+            return ec.generate_private_key(ec.SECP384R1())
+        scalar = int.from_bytes(self._derive(b'key/' + label), 'big') % (_P384_ORDER - 1) + 1
+        return ec.derive_private_key(scalar, ec.SECP384R1())
+
+    def _sign_certificate(self, builder, issuer_key):
+        try:
+            return builder.sign(issuer_key, hashes.SHA384(), ecdsa_deterministic=True)
+        except TypeError:  # cryptography < 43
+            return builder.sign(issuer_key, hashes.SHA384())
+
+    def _certificate(self, common_name, key, issuer, issuer_key, label, days, path_length):
+        epoch = datetime.datetime.fromtimestamp(self._epoch_ms / 1000, datetime.timezone.utc)
+        subject = x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, 'US'),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'Amazon'),
+            x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, 'AWS'),
+            x509.NameAttribute(NameOID.COMMON_NAME, common_name),
+        ])
+        is_ca = path_length is not None and path_length >= 0
+        builder = (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(issuer.subject if issuer is not None else subject)
+            .public_key(key.public_key())
+            .serial_number(int.from_bytes(self._derive(b'serial/' + label)[:16], 'big') >> 1)
+            .not_valid_before(epoch - datetime.timedelta(days=1))
+            .not_valid_after(epoch + datetime.timedelta(days=days))
+            .add_extension(x509.BasicConstraints(ca=is_ca, path_length=path_length if is_ca else None),
+                           critical=True)
+            .add_extension(x509.KeyUsage(
+                digital_signature=True, content_commitment=False, key_encipherment=False,
+                data_encipherment=False, key_agreement=False, key_cert_sign=is_ca,
+                crl_sign=is_ca, encipher_only=False, decipher_only=False), critical=True)
+            .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()),
+                           critical=False)
+        )
+        if issuer is not None:
+            builder = builder.add_extension(
+                x509.AuthorityKeyIdentifier.from_issuer_public_key(issuer_key.public_key()),
+                critical=False)
+        return self._sign_certificate(builder, issuer_key if issuer is not None else key)
+
+    def _build_chain(self):
+        """root → zonal → regional → instance → leaf (실제 Nitro 체인과 같은 깊이)
+
+        seed 모드는 epoch가 고정이라 유효기간을 길게 잡아 검증 시점과 상관없이 체인이 유효하게 합니다.
+        """
+        names = [
+            (b'root', 'emulator.nitro-enclaves', CERT_VALIDITY_DAYS, 3),
+            (b'zonal', f'{self._derive(b"zonal").hex()[:16]}.{REGION}.aws.nitro-enclaves',
+             CERT_VALIDITY_DAYS, 2),
+            (b'regional', f'{self._derive(b"regional").hex()[:12]}.zonal.{REGION}.aws.nitro-enclaves',
+             CERT_VALIDITY_DAYS, 1),
+            (b'instance', f'{self.module_id[:19]}.{REGION}.aws.nitro-enclaves', CERT_VALIDITY_DAYS, 0),
+        ]
+        issuer, issuer_key = None, None
+        self.cabundle = []
+        for label, common_name, days, path_length in names:
+            key = self._private_key(label)
+            cert = self._certificate(common_name, key, issuer, issuer_key, label, days, path_length)
+            self.cabundle.append(cert.public_bytes(serialization.Encoding.DER))
+            issuer, issuer_key = cert, key
+
+        self._leaf_key = self._private_key(b'leaf')
+        leaf = self._certificate(f'{self.module_id}.{REGION}.aws', self._leaf_key,
+                                 issuer, issuer_key, b'leaf', CERT_VALIDITY_DAYS, None)
+        self.certificate = leaf.public_bytes(serialization.Encoding.DER)
+        self.root_pem = x509.load_der_x509_certificate(self.cabundle[0]).public_bytes(
+            serialization.Encoding.PEM).decode('ascii')
+
+        try:
+            self._ecdsa = ec.ECDSA(hashes.SHA384(), deterministic_signing=self.deterministic)
+        except TypeError:  # cryptography < 42
+            self._ecdsa = ec.ECDSA(hashes.SHA384())
+
+    # ------------------------------------------------------------------
+    # NSM requests
+    # ------------------------------------------------------------------
+
+    def _timestamp(self):
+        if not self.deterministic:
+            return int(time.time() * 1000)
+        with self._lock:
+            self._doc_counter += 1
+            return self._epoch_ms + self._doc_counter
+
+    def attestation_doc(self, public_key=None, user_data=None, nonce=None):
+        payload = nsm_cbor.dumps({
+            'module_id': self.module_id,
+            'digest': 'SHA384',
+            'timestamp': self._timestamp(),
+            'pcrs': {index: self.pcrs[index] for index in range(PCR_COUNT)},
+            'certificate': self.certificate,
+            'cabundle': self.cabundle,
+            'public_key': public_key,
+            'user_data': user_data,
+            'nonce': nonce,
+        })
+        sig_structure = nsm_cbor.dumps(['Signature1', self._protected, b'', payload])
+        r, s = decode_dss_signature(self._leaf_key.sign(sig_structure, self._ecdsa))
+        signature = r.to_bytes(48, 'big') + s.to_bytes(48, 'big')
+        return nsm_cbor.dumps([self._protected, {}, payload, signature])
+
+    def random(self, length):
+        length = min(length, 256)
+        if not self.deterministic:
+            return os.urandom(length)
+        with self._lock:
+            self._random_counter += 1
+            counter = self._random_counter
+        return hashlib.shake_256(self.seed + b'/random/%d' % counter).digest(length)
+
+    def describe(self):
+        return {
+            'version_major': 1,
+            'version_minor': 0,
+            'version_patch': 0,
+            'module_id': self.module_id,
+            'max_pcrs': MAX_PCRS,
+            'locked_pcrs': sorted(self.locked_pcrs),
+            'digest': 'SHA384',
+        }
+
+    def extend_pcr(self, index, data):
+        with self._lock:
+            if index in self.locked_pcrs:
+                raise OSError(f'PCR{index} is locked')
+            self.pcrs[index] = hashlib.sha384(self.pcrs[index] + data).digest()
+            return self.pcrs[index]
+
+    def lock_pcr(self, index):
+        with self._lock:
+            self.locked_pcrs.add(index)
+
+    def describe_pcr(self, index):
+        return {'lock': index in self.locked_pcrs, 'data': self.pcrs[index]}
+
+
+# ============================================================================
+# aws_nsm_interface 호환 모듈 API (fd는 의미 없음)
+# ============================================================================
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_emulator():
+    """NSM_EMULATOR_SEED 환경 변수로 만든 프로세스 공용 emulator"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = NsmEmulator(os.environ.get('NSM_EMULATOR_SEED'))
+        return _default
+
+
+def open_nsm_device():
+    default_emulator()
+    return -1
+
+
+def close_nsm_device(file_desc):
+    pass
+
+
+def get_attestation_doc(file_desc, public_key=None, user_data=None, nonce=None):
+    return default_emulator().attestation_doc(public_key, user_data, nonce)
+
+
+def get_random(file_desc, length):
+    return default_emulator().random(length)
+
+
+def describe_nsm(file_desc):
+    return default_emulator().describe()
+
+
+def extend_pcr(file_desc, index, data):
+    return default_emulator().extend_pcr(index, data)
+
+
+def lock_pcr(file_desc, index):
+    return default_emulator().lock_pcr(index)
+
+
+def describe_pcr(file_desc, index):
+    return default_emulator().describe_pcr(index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='NSM Emulator')
+    parser.add_argument('--seed', default=os.environ.get('NSM_EMULATOR_SEED'),
+                        help='Deterministic seed (default: random keys)')
+    parser.add_argument('--export-root', help='Write the emulator root certificate (PEM) here')
+    parser.add_argument('--bench', type=int, default=0,
+                        help='Generate this many documents and report throughput')
+
+    args = parser.parse_args()
+    emulator = NsmEmulator(args.seed)
+
+    if args.export_root:
+        with open(args.export_root, 'w') as f:
+            f.write(emulator.root_pem)
+        print(f'Root certificate written to {args.export_root}')
+
+    if args.bench:
+        start = time.perf_counter()
+        size = 0
+        for i in range(args.bench):
+            size = len(emulator.attestation_doc(user_data=b'bench', nonce=i.to_bytes(8, 'big')))
+        elapsed = time.perf_counter() - start
+        print(f'{args.bench} documents in {elapsed:.2f}s '
+              f'({args.bench / elapsed * 60:,.0f}/min, {size} bytes each)')
+
+    if not args.export_root and not args.bench:
+        sys.stdout.buffer.write(emulator.attestation_doc())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+/dev/nsm stand-in device
+
+Nitro 하드웨어 없이 daemon 경로를 부하 테스트하기 위한 로컬 NSM 서버/클라이언트입니다.
+
+서버: Unix socket으로 NSM과 같은 CBOR 요청/응답을 주고받습니다 (4-byte big-endian 길이 + CBOR).
+    {"Attestation": {"user_data": ..., "nonce": ..., "public_key": ...}} → {"Attestation": {"document": ...}}
+    "GetRandom"                         → {"GetRandom": {"random": ...}}
+    "DescribeNSM"                       → {"DescribeNSM": {...}}
+    {"ExtendPCR": {"index", "data"}}    → {"ExtendPCR": {"data": ...}}
+    {"LockPCR": {"index"}}              → "LockPCR"
+    실패 시                              → {"Error": "InternalError"}
+  document는 nsm_emulator로 만들고, 명령별 지연/jitter/오류율을 주입할 수 있습니다.
+  실제 디바이스처럼 요청은 한 번에 하나씩 처리합니다 (--concurrency로 변경).
+
+클라이언트: aws_nsm_interface와 같은 함수를 제공합니다. get_attestation.py에서
+NSM_DEVICE_SOCKET=/tmp/nsm-device.sock 을 주면 이 backend를 사용합니다.
+NSM Error 응답은 OSError(EIO)로 올라가므로 디바이스 reopen/재시도 경로도 그대로 탑니다.
+
+Usage:
+    python3 nsm_standin.py --socket /tmp/nsm-device.sock --seed load \\
+        --latency-ms Attestation=40,GetRandom=1 --jitter-ms 10 --error-rate 0.01
+"""
+
+import os
+import sys
+import time
+import errno
+import random
+import signal
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+
+import nsm_cbor
+
+DEFAULT_DEVICE_SOCKET = '/tmp/nsm-device.sock'
+
+# 명령별 기본 지연 (ms)
+DEFAULT_LATENCY_MS = {
+    'Attestation': 40.0,
+    'GetRandom': 1.0,
+    'DescribeNSM': 0.5,
+    'ExtendPCR': 1.0,
+    'LockPCR': 0.5,
+}
+
+
+# ============================================================================
+# Framing
+# ============================================================================
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def send_frame(sock, obj):
+    body = nsm_cbor.dumps(obj)
+    sock.sendall(struct.pack('>I', len(body)) + body)
+
+
+def recv_frame(sock):
+    """frame 하나 수신 (연결이 닫혔으면 None)"""
+    header = _recv_exact(sock, 4)
+    if header is None:
+        return None
+    body = _recv_exact(sock, struct.unpack('>I', header)[0])
+    if body is None:
+        return None
+    return nsm_cbor.loads(body)
+
+
+# ============================================================================
+# Server
+# ============================================================================
+
+class FaultInjector:
+    """명령별 지연 + jitter + 오류율 (seed를 주면 재현 가능)"""
+
+    def __init__(self, latency_ms=None, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self.latency_ms = dict(DEFAULT_LATENCY_MS)
+        self.latency_ms.update(latency_ms or {})
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self, command):
+        """(지연 초, 오류 여부)"""
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            failed = self._rng.random() < self.error_rate
+        return max(0.0, self.latency_ms.get(command, 0.0) + jitter) / 1000, failed
+
+
+class StandinDevice:
+    """요청 하나를 NsmEmulator로 처리 (동시 처리 수는 semaphore로 제한)"""
+
+    def __init__(self, emulator, faults, concurrency=1):
+        self.emulator = emulator
+        self.faults = faults
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self.counts = {}
+        self.errors = 0
+
+    def execute(self, request):
+        if isinstance(request, str):
+            command, args = request, {}
+        elif isinstance(request, dict) and len(request) == 1:
+            command, args = next(iter(request.items()))
+            args = args or {}
+        else:
+            return {'Error': 'InvalidOperation'}
+
+        delay, failed = self.faults.draw(command)
+        with self._slots:
+            time.sleep(delay)
+            self.counts[command] = self.counts.get(command, 0) + 1
+            if failed:
+                self.errors += 1
+                return {'Error': 'InternalError'}
+            try:
+                return self._dispatch(command, args)
+            except (KeyError, IndexError, TypeError):
+                return {'Error': 'InvalidArgument'}
+            except OSError:
+                return {'Error': 'ReadOnlyIndex'}
+
+    def _dispatch(self, command, args):
+        emulator = self.emulator
+        if command == 'Attestation':
+            document = emulator.attestation_doc(args.get('public_key'), args.get('user_data'),
+                                                args.get('nonce'))
+            return {'Attestation': {'document': document}}
+        if command == 'GetRandom':
+            return {'GetRandom': {'random': emulator.random(256)}}
+        if command == 'DescribeNSM':
+            return {'DescribeNSM': emulator.describe()}
+        if command == 'ExtendPCR':
+            return {'ExtendPCR': {'data': emulator.extend_pcr(args['index'], args['data'])}}
+        if command == 'LockPCR':
+            emulator.lock_pcr(args['index'])
+            return 'LockPCR'
+        return {'Error': 'InvalidOperation'}
+
+
+class StandinRequestHandler(socketserver.BaseRequestHandler):
+    """연결 하나 = 열린 /dev/nsm fd 하나"""
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (ValueError, IndexError, struct.error):
+                return
+            if request is None:
+                return
+            send_frame(self.request, self.server.device.execute(request))
+
+
+class StandinServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, device):
+        self.device = device
+        super().__init__(socket_path, StandinRequestHandler)
+
+
+def serve(socket_path, device):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    server = StandinServer(socket_path, device)
+    os.chmod(socket_path, 0o600)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+    print(f'[NSM stand-in] Listening on {socket_path} '
+          f'(module {device.emulator.module_id})', file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print(f'[NSM stand-in] Served {device.counts}, injected errors: {device.errors}',
+              file=sys.stderr, flush=True)
+
+
+# ============================================================================
+# aws_nsm_interface 호환 클라이언트 API (fd = 연결된 socket)
+# ============================================================================
+
+def open_nsm_device():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(os.environ.get('NSM_DEVICE_SOCKET', DEFAULT_DEVICE_SOCKET))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def close_nsm_device(file_desc):
+    file_desc.close()
+
+
+def _execute(file_desc, request):
+    if file_desc.fileno() < 0:
+        raise OSError(errno.EBADF, 'NSM stand-in connection is closed')
+    send_frame(file_desc, request)
+    response = recv_frame(file_desc)
+    if response is None:
+        raise OSError(errno.EIO, 'NSM stand-in closed the connection')
+    if isinstance(response, dict) and 'Error' in response:
+        raise OSError(errno.EIO, f'NSM error: {response["Error"]}')
+    return response
+
+
+def get_attestation_doc(file_desc, public_key=None, user_data=None, nonce=None):
+    request = {'Attestation': {'public_key': public_key, 'user_data': user_data, 'nonce': nonce}}
+    return _execute(file_desc, request)['Attestation']['document']
+
+
+def get_random(file_desc, length):
+    return _execute(file_desc, 'GetRandom')['GetRandom']['random'][:length]
+
+
+def describe_nsm(file_desc):
+    return _execute(file_desc, 'DescribeNSM')['DescribeNSM']
+
+
+def extend_pcr(file_desc, index, data):
+    return _execute(file_desc, {'ExtendPCR': {'index': index, 'data': data}})['ExtendPCR']['data']
+
+
+def lock_pcr(file_desc, index):
+    _execute(file_desc, {'LockPCR': {'index': index}})
+
+
+def parse_latency(value):
+    """'Attestation=40,GetRandom=1' → {'Attestation': 40.0, 'GetRandom': 1.0}"""
+    latency = {}
+    for item in filter(None, value.split(',')):
+        command, _, ms = item.partition('=')
+        if command not in DEFAULT_LATENCY_MS:
+            raise argparse.ArgumentTypeError(f'unknown NSM command: {command}')
+        latency[command] = float(ms)
+    return latency
+
+
+if __name__ == '__main__':
+    from nsm_emulator import NsmEmulator
+
+    parser = argparse.ArgumentParser(description='/dev/nsm stand-in device')
+    parser.add_argument('--socket', default=os.environ.get('NSM_DEVICE_SOCKET', DEFAULT_DEVICE_SOCKET),
+                        help='Unix socket path')
+    parser.add_argument('--seed', default=os.environ.get('NSM_EMULATOR_SEED'),
+                        help='Deterministic seed for documents and fault injection')
+    parser.add_argument('--latency-ms', type=parse_latency, default={},
+                        help='Per-command latency, e.g. Attestation=40,GetRandom=1')
+    parser.add_argument('--jitter-ms', type=float, default=0.0,
+                        help='Uniform +/- jitter added to every call')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of calls answered with an NSM error (0.0 - 1.0)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Requests processed at once (real NSM: 1)')
+
+    args = parser.parse_args()
+    faults = FaultInjector(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    serve(args.socket, StandinDevice(NsmEmulator(args.seed), faults, args.concurrency))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+verify_attestation.py 동작 확인 (NSM emulator document 사용)
+
+Usage:
+    python3 -m pytest -q scripts/test_verify_attestation.py
+    python3 scripts/test_verify_attestation.py
+"""
+
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import verify_attestation
+from verify_attestation import Check, Failure, verify_document
+
+try:
+    import cbor2
+    import nsm_emulator
+except ImportError:
+    cbor2 = nsm_emulator = None
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'verify_attestation.py')
+
+
+@unittest.skipIf(cbor2 is None or verify_attestation.x509 is None,
+                 'cbor2 and cryptography are required')
+class EmulatorDocumentTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.emulator = nsm_emulator.NsmEmulator('verify-test')
+        cls.document = cls.emulator.attestation_doc(user_data=b'hello')
+
+    def test_verifies_under_emulator_root(self):
+        result = verify_document(self.document, root_cert_pem=self.emulator.root_pem, cache=None)
+        self.assertTrue(result.valid, result.errors)
+        self.assertTrue(result.passed(Check.CERTIFICATE_CHAIN))
+        self.assertTrue(result.passed(Check.COSE_SIGNATURE))
+
+    def test_cli_root_cert(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.pem') as root:
+            root.write(self.emulator.root_pem)
+            root.flush()
+            proc = subprocess.run([sys.executable, SCRIPT, self.document.hex(),
+                                   '--root-cert', root.name], capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stdout)
+
+    def test_changed_payload_byte_fails_signature(self):
+        protected, unprotected, payload, signature = cbor2.loads(self.document)
+        index = payload.index(b'hello')
+        tampered = bytearray(payload)
+        tampered[index] ^= 0x01
+        document = cbor2.dumps([protected, unprotected, bytes(tampered), signature])
+
+        result = verify_document(document, root_cert_pem=self.emulator.root_pem, cache=None)
+        self.assertFalse(result.valid)
+        self.assertTrue(result.failed(Failure.SIGNATURE))
+        self.assertTrue(result.passed(Check.CERTIFICATE_CHAIN))
+
+    def test_aws_root_rejects_emulator_document(self):
+        result = verify_document(self.document, cache=None)
+        self.assertFalse(result.valid)
+        self.assertTrue(result.failed(Failure.SIGNATURE))
+
+        proc = subprocess.run([sys.executable, SCRIPT, self.document.hex()],
+                              capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 1, proc.stdout)
+
+
+@unittest.skipIf(cbor2 is None or verify_attestation.x509 is None,
+                 'cbor2 and cryptography are required')
+class MockDocumentTest(unittest.TestCase):
+
+    document = json.dumps({'pcrs': {'0': '00' * 48}, 'user_data': 'aGVsbG8='}).encode('utf-8')
+
+    def test_rejected_without_allow_mock(self):
+        result = verify_document(self.document, cache=None)
+        self.assertFalse(result.valid)
+        self.assertTrue(result.failed(Failure.NOT_ATTESTED))
+
+    def test_accepted_with_allow_mock(self):
+        result = verify_document(self.document, allow_mock=True, cache=None)
+        self.assertTrue(result.valid, result.errors)
+        self.assertFalse(result.is_real_attestation)
+
+    def test_cached_mock_result_is_per_option(self):
+        cache = verify_attestation.ExpiringCache(4)
+        self.assertTrue(verify_document(self.document, allow_mock=True, cache=cache).valid)
+        self.assertFalse(verify_document(self.document, cache=cache).valid)
+
+
+if __name__ == '__main__':
+    unittest.main()
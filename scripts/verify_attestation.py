@@ -6,13 +6,59 @@ AWS Nitro Enclave attestation document를 검증합니다.
 
 Usage:
     python3 verify_attestation.py <attestation_hex> [--expected-pcr0 <value>]
+    python3 verify_attestation.py <attestation_hex> --commitment <hash> --proof <p1,p2,...>
+    python3 verify_attestation.py <attestation_hex> --nonce <base64> [--nonce-proof <p1,p2,...>]
+    python3 verify_attestation.py <attestation_hex> --root-cert emulator-root.pem
+    python3 verify_attestation.py <stored_attestation_hex> --at-document-time
+    python3 verify_attestation.py <mock_json_hex> --allow-mock
+    python3 verify_attestation.py --batch attestations.ndjson [--workers 8] > results.ndjson
+
+COSE_Sign1 서명 (ES384)과 certificate → cabundle → AWS root 인증서 체인을 검증합니다.
+cbor2, cryptography 패키지가 필요합니다.
+
+--batch는 한 줄에 document 하나인 NDJSON(stdin 또는 파일)을 process pool로 검증하고,
+끝나는 순서대로 결과를 한 줄씩 JSON으로 출력합니다. 각 줄은 hex 문자열이거나
+{"id", "attestation" | "awsAttestationDocument", "expected_pcr0", "nonce", ...} 객체입니다.
+
+Library:
+    from verify_attestation import verify_document, Check
+    result = verify_document(document_bytes, nonce=nonce_b64)
+    result.valid, result.passed(Check.COSE_SIGNATURE), result.errors
+같은 document를 다시 검증하면 RESULT_CACHE의 결과를 돌려줍니다 (cache=None으로 끔).
 """
 
+import os
 import sys
 import json
 import base64
+import enum
+import signal
+import hashlib
 import argparse
-from datetime import datetime
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+except ImportError:
+    x509 = None
+
+# Merkle 규칙/CBOR 인코딩은 enclave 쪽 스크립트와 공유
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nsm'))
+import merkle
+import nsm_cbor
 
 # AWS Root Certificate (공개됨)
 AWS_ROOT_CERT_PEM = """-----BEGIN CERTIFICATE-----
@@ -30,124 +76,756 @@ rfMCMQCi85sWBbJwKKXdS6BptQFuZbT73o/gBh1qUxl/nNr12UO8Yfwr6wPLb+6N
 IwLz3/Y=
 -----END CERTIFICATE-----"""
 
-def verify_attestation(attestation_hex: str, expected_pcr0: str = None) -> dict:
-    """Attestation document 검증"""
-    
-    result = {
-        'valid': False,
-        'checks': [],
-        'pcrs': {},
-        'errors': [],
-    }
-    
+# COSE alg -35 = ECDSA w/ SHA-384 (Nitro attestation document)
+COSE_ALG_ES384 = -35
+# 검증된 인증서 체인 캐시 크기 (region/zone 조합 × enclave 인스턴스)
+CHAIN_CACHE_SIZE = 256
+# 검증 결과 캐시 (같은 document를 polling으로 반복 검증하는 경우)
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 300
+# --batch: worker당 동시에 제출해 두는 document 수 (메모리 상한)
+BATCH_WINDOW_PER_WORKER = 16
+# NDJSON 줄별로 덮어쓸 수 있는 검증 옵션
+BATCH_OPTIONS = ('expected_pcr0', 'commitment', 'proof', 'nonce', 'nonce_proof', 'at_document_time')
+BATCH_DOCUMENT_KEYS = ('attestation', 'awsAttestationDocument', 'document')
+
+
+class VerificationError(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def load_trust_anchor(pem: str = AWS_ROOT_CERT_PEM):
+    """신뢰할 root 인증서 (PEM별로 프로세스당 한 번만 파싱)"""
+    return x509.load_pem_x509_certificate(pem.encode('ascii'))
+
+
+@functools.lru_cache(maxsize=256)
+def _load_der_certificate(der: bytes):
+    # region/zone 별 intermediate는 document마다 같으므로 파싱 결과를 재사용
+    return x509.load_der_x509_certificate(der)
+
+
+def _validity(cert):
+    try:
+        return cert.not_valid_before_utc, cert.not_valid_after_utc
+    except AttributeError:  # cryptography < 42
+        return (cert.not_valid_before.replace(tzinfo=timezone.utc),
+                cert.not_valid_after.replace(tzinfo=timezone.utc))
+
+
+class ExpiringCache:
+    """만료 시각이 있는 LRU 캐시 (인증서 체인, 검증 결과)
+
+    만료 시각이 지난 entry는 조회할 때 버리고, 크기를 넘으면 가장 오래 안 쓴 entry부터 밀어냅니다.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, now):
+        """key가 캐시에 있고 now에 아직 유효하면 그 값, 아니면 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now <= entry[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+# 검증을 통과한 인증서 체인: root + 체인 DER bytes의 SHA-256 → 체인이 유효한 (notBefore, notAfter)
+CHAIN_CACHE = ExpiringCache(CHAIN_CACHE_SIZE)
+
+
+def _chain_digest(root, cabundle):
+    """root + cabundle DER bytes의 SHA-256 (leaf까지 이어서 해싱할 수 있게 hash 객체 반환)"""
+    digest = hashlib.sha256(root.public_bytes(serialization.Encoding.DER))
+    for der in cabundle:
+        digest.update(len(der).to_bytes(4, 'big'))
+        digest.update(der)
+    return digest
+
+
+def _check_validity(cert, now):
+    not_before, not_after = _validity(cert)
+    if not not_before <= now <= not_after:
+        raise VerificationError(
+            f'Certificate {cert.subject.rfc4514_string()} is not valid at {now.isoformat()} '
+            f'({not_before.isoformat()} - {not_after.isoformat()})')
+    return not_before, not_after
+
+
+def _overlap(windows):
+    """(notBefore, notAfter) 구간들이 모두 겹치는 구간"""
+    windows = list(windows)
+    return max(w[0] for w in windows), min(w[1] for w in windows)
+
+
+def _check_issued_by(cert, issuer):
+    try:
+        cert.verify_directly_issued_by(issuer)
+    except (ValueError, TypeError, InvalidSignature) as e:
+        raise VerificationError(
+            f'{cert.subject.rfc4514_string()} is not signed by '
+            f'{issuer.subject.rfc4514_string()}: {e or type(e).__name__}')
+
+
+def _verify_cabundle(chain, root, now):
+    """root → intermediates 검증 후 모든 인증서가 유효한 (notBefore, notAfter) 반환"""
+    if chain[0] != root:
+        raise VerificationError('CA bundle does not start with the trusted root certificate')
+
+    validity = _overlap(_check_validity(cert, now) for cert in chain)
+
+    for ca in chain:
+        try:
+            constraints = ca.extensions.get_extension_for_class(x509.BasicConstraints).value
+        except x509.ExtensionNotFound:
+            constraints = None
+        if constraints is None or not constraints.ca:
+            raise VerificationError(f'{ca.subject.rfc4514_string()} is not a CA certificate')
+
+    for issuer, cert in zip(chain, chain[1:]):
+        _check_issued_by(cert, issuer)
+    return validity
+
+
+def verify_certificate_chain(certificate: bytes, cabundle: list, root, now: datetime = None,
+                             cache: ExpiringCache = CHAIN_CACHE):
+    """certificate → cabundle → root 체인 검증 후 leaf 인증서 반환
+
+    cabundle은 [ROOT, INTERM_1, ..., INTERM_N] 순서이고, cabundle[0]은 신뢰하는 root와 같아야 합니다.
+    각 인증서는 바로 앞 인증서가 서명했고 지금 유효해야 하며, leaf를 제외하면 CA여야 합니다.
+
+    cache가 있으면 cabundle과 (cabundle + leaf) 체인을 따로 기억합니다. 같은 region/zone의
+    새 enclave는 leaf 서명만, 이미 본 enclave는 체인 서명 검증 없이 바로 통과합니다.
+    """
+    return _verify_chain(certificate, cabundle, root, now, cache)[0]
+
+
+def _verify_chain(certificate, cabundle, root, now=None, cache=CHAIN_CACHE):
+    """verify_certificate_chain과 같지만 (leaf, 체인에서 가장 이른 notAfter) 반환
+
+    now는 과거일 수도 있으므로 (document timestamp 기준 검증) 캐시에는 체인이 유효한
+    (notBefore, notAfter)를 두고, 캐시 hit도 notBefore <= now 일 때만 씁니다.
+    """
+    if not cabundle:
+        raise VerificationError('Empty CA bundle')
+    cabundle = [bytes(der) for der in cabundle]
+    certificate = bytes(certificate)
+    leaf = _load_der_certificate(certificate)
+    now = now or datetime.now(timezone.utc)
+
+    if cache is None:
+        chain = [_load_der_certificate(der) for der in cabundle]
+        validity = _overlap([_verify_cabundle(chain, root, now), _check_validity(leaf, now)])
+        _check_issued_by(leaf, chain[-1])
+        return leaf, validity[1]
+
+    digest = _chain_digest(root, cabundle)
+    bundle_key = digest.digest()
+    digest.update(len(certificate).to_bytes(4, 'big'))
+    digest.update(certificate)
+    chain_key = digest.digest()
+
+    validity = cache.get(chain_key, now)
+    if validity is not None and validity[0] <= now:
+        return leaf, validity[1]
+
+    bundle_validity = cache.get(bundle_key, now)
+    if bundle_validity is None or now < bundle_validity[0]:
+        bundle_validity = _verify_cabundle([_load_der_certificate(der) for der in cabundle],
+                                           root, now)
+        cache.put(bundle_key, bundle_validity, bundle_validity[1])
+
+    validity = _overlap([bundle_validity, _check_validity(leaf, now)])
+    _check_issued_by(leaf, _load_der_certificate(cabundle[-1]))
+    cache.put(chain_key, validity, validity[1])
+    return leaf, validity[1]
+
+
+def verify_cose_signature(protected: bytes, payload: bytes, signature: bytes, leaf):
+    """COSE_Sign1 서명 검증 (Sig_structure = ["Signature1", protected, b"", payload])"""
+    header = nsm_cbor.loads(protected) if protected else {}
+    alg = header.get(1) if isinstance(header, dict) else None
+    if alg != COSE_ALG_ES384:
+        raise VerificationError(f'Unsupported COSE algorithm: {alg} (expected ES384)')
+    if len(signature) != 96:
+        raise VerificationError(f'ES384 signature must be 96 bytes, got {len(signature)}')
+
+    public_key = leaf.public_key()
+    if not isinstance(public_key, ec.EllipticCurvePublicKey) or public_key.curve.name != 'secp384r1':
+        raise VerificationError('Leaf certificate key is not ECDSA P-384')
+
+    der_signature = encode_dss_signature(int.from_bytes(signature[:48], 'big'),
+                                         int.from_bytes(signature[48:], 'big'))
+    sig_structure = nsm_cbor.dumps(['Signature1', protected, b'', payload])
+    try:
+        public_key.verify(der_signature, sig_structure, ec.ECDSA(hashes.SHA384()))
+    except InvalidSignature:
+        raise VerificationError('COSE_Sign1 signature does not match the payload') from None
+
+class Check(enum.IntEnum):
+    """통과한 검증 항목"""
+    HEX_DECODED = 1
+    COSE_STRUCTURE = 2
+    PCRS_FOUND = 3
+    TIMESTAMP = 4
+    MODULE_ID = 5
+    USER_DATA = 6
+    CERTIFICATE_CHAIN = 7
+    COSE_SIGNATURE = 8
+    NOT_COSE = 9
+    MOCK_JSON = 10
+    PCR0_MATCH = 11
+    COMMITMENT_INCLUDED = 12
+    NONCE_MATCH = 13
+    NONCE_INCLUDED = 14
+
+
+class Failure(enum.IntEnum):
+    """실패한 검증 항목"""
+    DEPENDENCY_MISSING = 1
+    UNPARSEABLE = 2
+    SIGNATURE = 3
+    PCR0_MISMATCH = 4
+    INVALID_COMMITMENT = 5
+    NO_MERKLE_ROOT = 6
+    COMMITMENT_NOT_INCLUDED = 7
+    INVALID_NONCE = 8
+    NO_NONCE = 9
+    NONCE_MISMATCH = 10
+    EXCEPTION = 11
+    NOT_ATTESTED = 12
+
+
+def _format_timestamp(ts):
+    dt = datetime.fromtimestamp(ts / 1000) if ts > 1e12 else datetime.fromtimestamp(ts)
+    return f"✓ Timestamp: {dt.isoformat()}"
+
+
+# (code, detail) → 사람이 읽는 문자열 (result.checks / result.errors를 읽을 때만 만듦)
+CHECK_MESSAGES = {
+    Check.HEX_DECODED: lambda _: "✓ Hex decoding successful",
+    Check.COSE_STRUCTURE: lambda _: "✓ Valid COSE_Sign1 structure",
+    Check.PCRS_FOUND: lambda count: f"✓ Found {count} PCR values",
+    Check.TIMESTAMP: _format_timestamp,
+    Check.MODULE_ID: lambda module_id: f"✓ Module ID: {module_id}",
+    Check.USER_DATA: lambda _: "✓ User data present",
+    Check.CERTIFICATE_CHAIN: lambda count: f"✓ Certificate chain valid ({count} CA certs to trusted root)",
+    Check.COSE_SIGNATURE: lambda _: "✓ COSE_Sign1 signature valid (ES384)",
+    Check.NOT_COSE: lambda reason: f"⚠ Not COSE format: {reason[:50]}",
+    Check.MOCK_JSON: lambda _: "✓ Valid JSON (mock attestation)",
+    Check.PCR0_MATCH: lambda _: "✓ PCR0 matches expected value",
+    Check.COMMITMENT_INCLUDED: lambda root: f"✓ Commitment included in Merkle root {merkle.to_hex(root)}",
+    Check.NONCE_MATCH: lambda _: "✓ Nonce matches",
+    Check.NONCE_INCLUDED: lambda root: f"✓ Nonce included in aggregated nonce root {merkle.to_hex(root)}",
+}
+
+FAILURE_MESSAGES = {
+    Failure.DEPENDENCY_MISSING: lambda package: f"{package} not installed. Run: pip3 install {package}",
+    Failure.UNPARSEABLE: lambda _: "Failed to parse as COSE or JSON",
+    Failure.SIGNATURE: lambda e: f"✗ Signature verification failed: {e}",
+    Failure.PCR0_MISMATCH: lambda pcrs: f"✗ PCR0 mismatch!\n  Expected: {pcrs[0]}\n  Actual:   {pcrs[1]}",
+    Failure.INVALID_COMMITMENT: lambda e: f"✗ Invalid commitment/proof: {e}",
+    Failure.NO_MERKLE_ROOT: lambda _: "✗ Document has no Merkle root in user_data",
+    Failure.COMMITMENT_NOT_INCLUDED: lambda _: "✗ Commitment not included in attested Merkle root",
+    Failure.INVALID_NONCE: lambda e: f"✗ Invalid nonce/nonce proof: {e}",
+    Failure.NO_NONCE: lambda _: "✗ Document has no nonce",
+    Failure.NONCE_MISMATCH: lambda _: "✗ Nonce mismatch",
+    Failure.EXCEPTION: lambda e: f"Verification failed: {e}",
+    Failure.NOT_ATTESTED: lambda _: "✗ Not a signed Nitro attestation (mock documents need --allow-mock)",
+}
+
+
+class VerificationResult:
+    """verify_document() 결과
+
+    checks/errors는 (Check | Failure, detail) 목록으로만 기록하고, 출력용 문자열은
+    .checks / .errors / to_dict()를 호출할 때 만듭니다. 예외는 str(e)로만 남깁니다
+    (예외 객체의 traceback이 document를 붙잡은 채 RESULT_CACHE에 남지 않도록).
+    """
+
+    __slots__ = ('check_codes', 'error_codes', 'is_real_attestation', 'raw_pcrs',
+                 'timestamp', 'module_id', 'user_data', 'nonce', 'not_after')
+
+    def __init__(self):
+        self.check_codes = []
+        self.error_codes = []
+        self.is_real_attestation = None
+        self.raw_pcrs = {}       # COSE: {int: bytes}, mock: JSON 값 그대로
+        self.timestamp = None    # ms (COSE) 또는 초
+        self.module_id = None
+        self.user_data = None    # bytes
+        self.nonce = None        # bytes
+        self.not_after = None    # 인증서 체인에서 가장 이른 notAfter (검증된 경우)
+
+    def copy(self) -> 'VerificationResult':
+        clone = VerificationResult()
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.check_codes = list(self.check_codes)
+        clone.error_codes = list(self.error_codes)
+        return clone
+
+    @property
+    def valid(self) -> bool:
+        return not self.error_codes
+
+    def passed(self, check: Check) -> bool:
+        return any(code == check for code, _ in self.check_codes)
+
+    def failed(self, failure: Failure) -> bool:
+        return any(code == failure for code, _ in self.error_codes)
+
+    @property
+    def pcrs(self) -> dict:
+        """{'0': hex, ...}"""
+        return {str(index): value.hex() if isinstance(value, (bytes, bytearray)) else value
+                for index, value in self.raw_pcrs.items()}
+
+    def pcr(self, index: int):
+        value = self.raw_pcrs.get(index, self.raw_pcrs.get(str(index)))
+        return value.hex() if isinstance(value, (bytes, bytearray)) else value
+
+    @property
+    def checks(self) -> list:
+        return [CHECK_MESSAGES[code](detail) for code, detail in self.check_codes]
+
+    @property
+    def errors(self) -> list:
+        return [FAILURE_MESSAGES[code](detail) for code, detail in self.error_codes]
+
+    def to_dict(self) -> dict:
+        """verify_attestation()의 dict 형식"""
+        result = {
+            'valid': self.valid,
+            'checks': self.checks,
+            'pcrs': self.pcrs,
+            'errors': self.errors,
+        }
+        if self.is_real_attestation is not None:
+            result['is_real_attestation'] = self.is_real_attestation
+        if self.timestamp is not None:
+            result['timestamp'] = self.timestamp
+        if self.module_id is not None:
+            result['module_id'] = self.module_id
+        if self.is_real_attestation and isinstance(self.user_data, bytes):
+            try:
+                result['user_data'] = self.user_data.decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+        return result
+
+
+# 검증 결과: (document SHA-384, 검증 옵션) → VerificationResult
+RESULT_CACHE = ExpiringCache(RESULT_CACHE_SIZE)
+
+
+def _document_time(timestamp):
+    """document timestamp (Unix epoch ms) → 인증서 유효기간을 확인할 시각"""
+    if not isinstance(timestamp, int) or isinstance(timestamp, bool):
+        raise VerificationError('Document has no timestamp to check certificate validity at')
+    try:
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        raise VerificationError(f'Document timestamp {timestamp} is out of range') from None
+
+
+def _parse_cose(result: VerificationResult, document, root_cert_pem: str, now: datetime,
+                at_document_time: bool = False):
+    cose = cbor2.loads(document)
+    if not (isinstance(cose, list) and len(cose) == 4):
+        raise ValueError("Not a valid COSE_Sign1 structure")
+
+    protected, unprotected, payload, signature = cose
+    result.check_codes.append((Check.COSE_STRUCTURE, None))
+    result.is_real_attestation = True
+
+    attestation = cbor2.loads(payload)
+
+    if 'pcrs' in attestation:
+        result.raw_pcrs = attestation['pcrs']
+        result.check_codes.append((Check.PCRS_FOUND, len(result.raw_pcrs)))
+
+    if 'timestamp' in attestation:
+        result.timestamp = attestation['timestamp']
+        result.check_codes.append((Check.TIMESTAMP, result.timestamp))
+
+    if 'module_id' in attestation:
+        result.module_id = attestation['module_id']
+        result.check_codes.append((Check.MODULE_ID, result.module_id))
+
+    if attestation.get('user_data'):
+        result.user_data = attestation['user_data']
+        result.check_codes.append((Check.USER_DATA, None))
+
+    if attestation.get('nonce'):
+        result.nonce = bytes(attestation['nonce'])
+
+    # Certificate chain + 서명 검증 (실패해도 mock JSON 파싱으로 넘어가지 않음)
+    # at_document_time이면 지금이 아니라 document를 만든 시각에 체인이 유효했는지 확인
+    # (저장해 둔 boot attestation 등, 인증서가 이미 만료된 document 재검증)
+    try:
+        if at_document_time:
+            now = _document_time(result.timestamp)
+        leaf, result.not_after = _verify_chain(attestation.get('certificate') or b'',
+                                               attestation.get('cabundle') or [],
+                                               load_trust_anchor(root_cert_pem), now)
+        result.check_codes.append((Check.CERTIFICATE_CHAIN, len(attestation['cabundle'])))
+        verify_cose_signature(protected, payload, signature, leaf)
+        result.check_codes.append((Check.COSE_SIGNATURE, None))
+    except (VerificationError, ValueError) as e:
+        result.error_codes.append((Failure.SIGNATURE, str(e)))
+
+
+def _parse_mock(result: VerificationResult, document):
+    doc = json.loads(bytes(document).decode('utf-8'))
+    result.check_codes.append((Check.MOCK_JSON, None))
+
+    if 'pcrs' in doc:
+        result.raw_pcrs = doc['pcrs']
+    elif 'pcr0' in doc:
+        result.raw_pcrs = {'0': doc.get('pcr0'), '1': doc.get('pcr1'), '2': doc.get('pcr2')}
+
+    if doc.get('user_data'):
+        result.user_data = base64.b64decode(doc['user_data'])
+    if doc.get('nonce'):
+        result.nonce = base64.b64decode(doc['nonce'])
+
+
+def verify_document(document, expected_pcr0: str = None,
+                    commitment: str = None, proof: list = None,
+                    nonce: str = None, nonce_proof: list = None,
+                    root_cert_pem: str = AWS_ROOT_CERT_PEM, allow_mock: bool = False,
+                    at_document_time: bool = False,
+                    cache: ExpiringCache = RESULT_CACHE) -> VerificationResult:
+    """Attestation document (bytes / bytearray / memoryview) 검증
+
+    COSE document는 서명과 인증서 체인까지 검증합니다. root_cert_pem으로 신뢰할 root를
+    바꿀 수 있습니다 (NSM emulator의 test root 등).
+    commitment/proof가 주어지면 user_data에 들어있는 Merkle root에
+    commitment가 포함되는지도 확인합니다 (get_attestation.py attestation-merkle).
+    nonce(base64)가 주어지면 document의 nonce와 같은지, 또는 nonce_proof로
+    aggregated nonce root에 포함되는지 확인합니다 (daemon --aggregate-window-ms).
+    서명이 없는 JSON mock document는 allow_mock=True일 때만 유효할 수 있습니다
+    (PCR/nonce/user_data를 누구나 만들 수 있으므로 개발용).
+    at_document_time=True면 인증서 유효기간을 지금 대신 document timestamp 기준으로 확인합니다
+    (인증서가 이미 만료된, 저장해 둔 document 재검증용).
+
+    같은 document + 옵션의 결과는 cache에서 바로 돌려줍니다 (SHA-384 한 번 + dict 조회).
+    entry는 RESULT_CACHE_TTL초 또는 인증서 체인의 notAfter 중 이른 시각에 만료됩니다.
+    at_document_time이면 결과가 지금 시각과 무관하므로 (document timestamp는 document에
+    들어 있어 key의 SHA-384에 포함됨) notAfter로 자르지 않고 TTL만 적용합니다.
+    document의 나이(freshness)는 여기서 판단하지 않으므로 expiry에도 넣지 않습니다.
+    반환된 결과는 캐시와 공유되므로 수정하지 마세요.
+    """
+    now = datetime.now(timezone.utc)
+    if cache is None:
+        return _verify_document(document, expected_pcr0, commitment, proof, nonce, nonce_proof,
+                                root_cert_pem, allow_mock, at_document_time, now)
+
     try:
-        import cbor2
-    except ImportError:
-        result['errors'].append("cbor2 not installed. Run: pip3 install cbor2")
+        key = (hashlib.sha384(document).digest(), expected_pcr0, commitment, tuple(proof or ()),
+               nonce, tuple(nonce_proof or ()), root_cert_pem, allow_mock, at_document_time)
+        result = cache.get(key, now)
+    except TypeError:
+        # hash할 수 없는 옵션 값 (list/dict 등): 캐시 없이 검증하고 오류는 결과로 보고
+        key, result = None, None
+    if result is None:
+        result = _verify_document(document, expected_pcr0, commitment, proof, nonce, nonce_proof,
+                                  root_cert_pem, allow_mock, at_document_time, now)
+        if key is not None and not result.failed(Failure.EXCEPTION) \
+                and not result.failed(Failure.DEPENDENCY_MISSING):
+            expires = now + timedelta(seconds=RESULT_CACHE_TTL)
+            if result.not_after is not None and not at_document_time:
+                expires = min(expires, result.not_after)
+            cache.put(key, result, expires)
+    return result
+
+
+def _verify_document(document, expected_pcr0, commitment, proof, nonce, nonce_proof,
+                     root_cert_pem, allow_mock, at_document_time, now):
+    result = VerificationResult()
+
+    if cbor2 is None:
+        result.error_codes.append((Failure.DEPENDENCY_MISSING, 'cbor2'))
         return result
-    
+    if x509 is None:
+        result.error_codes.append((Failure.DEPENDENCY_MISSING, 'cryptography'))
+        return result
+
     try:
-        # 1. Hex 디코딩
-        hex_clean = attestation_hex.replace('0x', '')
-        doc_bytes = bytes.fromhex(hex_clean)
-        result['checks'].append("✓ Hex decoding successful")
-        
-        # 2. COSE_Sign1 파싱 시도
+        # 1. COSE_Sign1 파싱 시도
         try:
-            cose = cbor2.loads(doc_bytes)
-            
-            if isinstance(cose, list) and len(cose) == 4:
-                protected, unprotected, payload, signature = cose
-                result['checks'].append("✓ Valid COSE_Sign1 structure")
-                result['is_real_attestation'] = True
-                
-                # Payload 디코딩
-                attestation = cbor2.loads(payload)
-                
-                # PCR 추출
-                if 'pcrs' in attestation:
-                    for pcr_idx, pcr_val in attestation['pcrs'].items():
-                        pcr_hex = pcr_val.hex() if isinstance(pcr_val, bytes) else str(pcr_val)
-                        result['pcrs'][str(pcr_idx)] = pcr_hex
-                    result['checks'].append(f"✓ Found {len(result['pcrs'])} PCR values")
-                
-                # Timestamp
-                if 'timestamp' in attestation:
-                    ts = attestation['timestamp']
-                    result['timestamp'] = ts
-                    dt = datetime.fromtimestamp(ts / 1000) if ts > 1e12 else datetime.fromtimestamp(ts)
-                    result['checks'].append(f"✓ Timestamp: {dt.isoformat()}")
-                
-                # Module ID
-                if 'module_id' in attestation:
-                    result['module_id'] = attestation['module_id']
-                    result['checks'].append(f"✓ Module ID: {attestation['module_id']}")
-                
-                # User data
-                if 'user_data' in attestation and attestation['user_data']:
-                    try:
-                        ud = attestation['user_data']
-                        if isinstance(ud, bytes):
-                            result['user_data'] = ud.decode('utf-8')
-                        result['checks'].append("✓ User data present")
-                    except:
-                        pass
-                
-                # Certificate chain 확인
-                if 'certificate' in attestation:
-                    result['checks'].append("✓ Certificate present")
-                if 'cabundle' in attestation:
-                    result['checks'].append(f"✓ CA bundle: {len(attestation.get('cabundle', []))} certs")
-                
-                # TODO: 실제 서명 검증 (cryptography 라이브러리 필요)
-                result['checks'].append("⚠ Signature verification: Not implemented")
-                
-            else:
-                raise ValueError("Not a valid COSE_Sign1 structure")
-                
+            _parse_cose(result, document, root_cert_pem, now, at_document_time)
         except Exception as e:
             # COSE 파싱 실패 - JSON으로 시도 (mock attestation)
-            result['is_real_attestation'] = False
-            result['checks'].append(f"⚠ Not COSE format: {str(e)[:50]}")
-            
+            result.is_real_attestation = False
+            result.check_codes.append((Check.NOT_COSE, str(e)))
             try:
-                doc = json.loads(doc_bytes.decode('utf-8'))
-                result['checks'].append("✓ Valid JSON (mock attestation)")
-                
-                if 'pcrs' in doc:
-                    result['pcrs'] = doc['pcrs']
-                elif 'pcr0' in doc:
-                    result['pcrs'] = {'0': doc.get('pcr0'), '1': doc.get('pcr1'), '2': doc.get('pcr2')}
-                    
-            except json.JSONDecodeError:
-                result['errors'].append("Failed to parse as COSE or JSON")
+                _parse_mock(result, document)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                result.error_codes.append((Failure.UNPARSEABLE, None))
                 return result
-        
-        # 3. PCR0 검증
+            if not allow_mock:
+                result.error_codes.append((Failure.NOT_ATTESTED, None))
+
+        # 2. PCR0 검증
         if expected_pcr0:
-            actual_pcr0 = result['pcrs'].get('0', '')
+            actual_pcr0 = result.pcr(0) or ''
             if actual_pcr0 == expected_pcr0:
-                result['checks'].append(f"✓ PCR0 matches expected value")
+                result.check_codes.append((Check.PCR0_MATCH, None))
+            else:
+                result.error_codes.append((Failure.PCR0_MISMATCH, (expected_pcr0, actual_pcr0)))
+
+        # 3. Merkle inclusion 검증 (commitment가 user_data root에 포함되는지)
+        if commitment:
+            try:
+                leaf = merkle.parse_hash(commitment)
+                path = [merkle.parse_hash(p) for p in (proof or [])]
+            except ValueError as e:
+                result.error_codes.append((Failure.INVALID_COMMITMENT, str(e)))
             else:
-                result['errors'].append(f"✗ PCR0 mismatch!\n  Expected: {expected_pcr0}\n  Actual:   {actual_pcr0}")
-        
-        # 최종 판정
-        if not result['errors']:
-            result['valid'] = True
-            
+                user_data = result.user_data
+                if user_data is None or len(user_data) != 32:
+                    result.error_codes.append((Failure.NO_MERKLE_ROOT, None))
+                elif merkle.verify_proof(leaf, path, bytes(user_data)):
+                    result.check_codes.append((Check.COMMITMENT_INCLUDED, user_data))
+                else:
+                    result.error_codes.append((Failure.COMMITMENT_NOT_INCLUDED, None))
+
+        # 4. Nonce 검증 (직접 일치 또는 aggregated nonce root에 포함)
+        if nonce:
+            try:
+                expected_nonce = base64.b64decode(nonce, validate=True)
+                path = [merkle.parse_hash(p) for p in (nonce_proof or [])]
+            except ValueError as e:
+                result.error_codes.append((Failure.INVALID_NONCE, str(e)))
+            else:
+                if result.nonce is None:
+                    result.error_codes.append((Failure.NO_NONCE, None))
+                elif not path and result.nonce == expected_nonce:
+                    result.check_codes.append((Check.NONCE_MATCH, None))
+                elif merkle.verify_proof(merkle.keccak256(expected_nonce), path, result.nonce):
+                    result.check_codes.append((Check.NONCE_INCLUDED, result.nonce))
+                else:
+                    result.error_codes.append((Failure.NONCE_MISMATCH, None))
+
     except Exception as e:
-        result['errors'].append(f"Verification failed: {str(e)}")
-    
+        result.error_codes.append((Failure.EXCEPTION, str(e)))
+
+    return result
+
+
+def decode_hex(attestation_hex: str) -> bytes:
+    """hex 문자열 → bytes (앞의 0x 접두사만 제거)"""
+    text = attestation_hex.strip()
+    if text[:2] in ('0x', '0X'):
+        text = text[2:]
+    return bytes.fromhex(text)
+
+
+def verify_hex(attestation_hex: str, **options) -> VerificationResult:
+    """hex 문자열 document 검증 (CLI / NDJSON 입력)"""
+    try:
+        document = decode_hex(attestation_hex)
+    except ValueError as e:
+        result = VerificationResult()
+        result.error_codes.append((Failure.EXCEPTION, str(e)))
+        return result
+    result = verify_document(document, **options).copy()
+    result.check_codes.insert(0, (Check.HEX_DECODED, None))
     return result
 
+
+def verify_attestation(attestation_hex: str, expected_pcr0: str = None,
+                       commitment: str = None, proof: list = None,
+                       nonce: str = None, nonce_proof: list = None,
+                       root_cert_pem: str = AWS_ROOT_CERT_PEM, allow_mock: bool = False,
+                       at_document_time: bool = False) -> dict:
+    """Attestation document (hex) 검증 결과를 dict로 반환 (verify_document 참고)"""
+    return verify_hex(attestation_hex, expected_pcr0=expected_pcr0,
+                      commitment=commitment, proof=proof,
+                      nonce=nonce, nonce_proof=nonce_proof,
+                      root_cert_pem=root_cert_pem, allow_mock=allow_mock,
+                      at_document_time=at_document_time).to_dict()
+
+def parse_proof(value: str):
+    """comma-separated 또는 JSON list 형식의 Merkle proof 파싱"""
+    if value.strip().startswith('['):
+        return json.loads(value)
+    return [p.strip() for p in value.split(',') if p.strip()]
+
+# ============================================================================
+# Batch (NDJSON) 검증
+# ============================================================================
+
+_batch_defaults = {}
+
+
+def _init_batch_worker(defaults):
+    global _batch_defaults
+    _batch_defaults = defaults
+    # Ctrl-C는 부모가 처리 (worker마다 traceback이 찍히지 않게)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _parse_batch_line(line: str):
+    """NDJSON 한 줄 → (id, attestation hex, 옵션)"""
+    item = json.loads(line)
+    if isinstance(item, str):
+        return None, item, {}
+    if not isinstance(item, dict):
+        raise ValueError('expected a hex string or a JSON object')
+
+    attestation = next((item[key] for key in BATCH_DOCUMENT_KEYS if item.get(key)), None)
+    if not isinstance(attestation, str):
+        raise ValueError(f'missing attestation document (one of {", ".join(BATCH_DOCUMENT_KEYS)})')
+    options = {key: item[key] for key in BATCH_OPTIONS if item.get(key) is not None}
+    for key in ('proof', 'nonce_proof'):
+        if isinstance(options.get(key), str):
+            options[key] = parse_proof(options[key])
+    for key, value in options.items():
+        if key in ('proof', 'nonce_proof'):
+            if not isinstance(value, list) or not all(isinstance(p, str) for p in value):
+                raise ValueError(f'"{key}" must be a list of hashes or a comma-separated string')
+        elif key == 'at_document_time':
+            if not isinstance(value, bool):
+                raise ValueError(f'"{key}" must be true or false')
+        elif not isinstance(value, str):
+            raise ValueError(f'"{key}" must be a string')
+    return item.get('id'), attestation, options
+
+
+def verify_batch_line(line_no: int, line: str):
+    """worker에서 실행: (valid 여부, 결과 JSON 한 줄)"""
+    record_id = None
+    try:
+        record_id, attestation, options = _parse_batch_line(line)
+    except ValueError as e:
+        result = {'valid': False, 'checks': [], 'pcrs': {}, 'errors': [f'Invalid NDJSON line: {e}']}
+    else:
+        try:
+            result = verify_attestation(attestation, **dict(_batch_defaults, **options))
+        except Exception as e:
+            # 한 줄의 예외로 전체 batch가 멈추지 않게 결과 줄로 보고
+            result = {'valid': False, 'checks': [], 'pcrs': {}, 'errors': [f'Verification failed: {e}']}
+
+    output = {'line': line_no}
+    if record_id is not None:
+        output['id'] = record_id
+    output.update(result)
+    return result['valid'], json.dumps(output, ensure_ascii=False)
+
+
+def run_batch(source, defaults: dict, workers: int = None, out=None) -> tuple:
+    """source의 NDJSON 줄을 process pool에서 검증하고 끝나는 순서대로 out에 출력
+
+    제출해 둔 document가 worker × BATCH_WINDOW_PER_WORKER개를 넘지 않게 읽기를 멈추므로
+    입력 크기와 상관없이 메모리 사용량이 일정합니다. (검증 수, 유효 수) 반환.
+    """
+    out = out or sys.stdout
+    workers = workers or os.cpu_count() or 1
+    window = workers * BATCH_WINDOW_PER_WORKER
+    total = valid = 0
+    pending = set()
+
+    def drain(return_when):
+        nonlocal pending, total, valid
+        done, pending = wait(pending, return_when=return_when)
+        for future in done:
+            ok, line = future.result()
+            out.write(line + '\n')
+            total += 1
+            valid += ok
+        out.flush()
+
+    with ProcessPoolExecutor(workers, initializer=_init_batch_worker,
+                             initargs=(defaults,)) as pool:
+        for line_no, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            pending.add(pool.submit(verify_batch_line, line_no, line))
+            if len(pending) >= window:
+                drain(FIRST_COMPLETED)
+        while pending:
+            drain(FIRST_COMPLETED)
+    return total, valid
+
 def main():
     parser = argparse.ArgumentParser(description='Verify Nitro Attestation Document')
     parser.add_argument('attestation', nargs='?', help='Attestation document (hex)')
     parser.add_argument('--expected-pcr0', help='Expected PCR0 value')
     parser.add_argument('--file', help='Read attestation from file')
+    parser.add_argument('--commitment', help='Commitment hash to check against the attested Merkle root')
+    parser.add_argument('--proof', default='',
+                        help='Merkle inclusion proof (comma-separated hashes or JSON list)')
+    parser.add_argument('--nonce', help='Expected nonce (base64)')
+    parser.add_argument('--nonce-proof', default='',
+                        help='Inclusion proof of the nonce in an aggregated nonce root')
+    parser.add_argument('--root-cert',
+                        help='Trusted root certificate (PEM file) instead of the AWS Nitro root')
+    parser.add_argument('--allow-mock', action='store_true',
+                        help='Accept unsigned JSON mock attestations (development only)')
+    parser.add_argument('--at-document-time', action='store_true',
+                        help='Check certificate validity at the document timestamp instead of now '
+                             '(re-verifying stored attestations)')
+    parser.add_argument('--batch', nargs='?', const='-', metavar='NDJSON',
+                        help='Verify one document per NDJSON line (file or - for stdin), '
+                             'streaming one JSON result per line')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Worker processes for --batch (default: CPU count)')
     
     args = parser.parse_args()
     
+    root_cert_pem = AWS_ROOT_CERT_PEM
+    if args.root_cert:
+        with open(args.root_cert, 'r') as f:
+            root_cert_pem = f.read()
+
+    if args.batch is not None:
+        defaults = {
+            'expected_pcr0': args.expected_pcr0,
+            'commitment': args.commitment,
+            'proof': parse_proof(args.proof),
+            'nonce': args.nonce,
+            'nonce_proof': parse_proof(args.nonce_proof),
+            'root_cert_pem': root_cert_pem,
+            'allow_mock': args.allow_mock,
+            'at_document_time': args.at_document_time,
+        }
+        try:
+            if args.batch == '-':
+                total, valid = run_batch(sys.stdin, defaults, args.workers)
+            else:
+                with open(args.batch, 'r', encoding='utf-8') as f:
+                    total, valid = run_batch(f, defaults, args.workers)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        print(f"Verified {total} documents: {valid} valid, {total - valid} invalid", file=sys.stderr)
+        sys.exit(0 if valid == total else 1)
+
     # 입력 읽기
     if args.file:
         with open(args.file, 'r') as f:
@@ -159,35 +837,40 @@ def main():
         attestation = input().strip()
     
     # 검증
-    result = verify_attestation(attestation, args.expected_pcr0)
+    result = verify_hex(attestation, expected_pcr0=args.expected_pcr0,
+                        commitment=args.commitment, proof=parse_proof(args.proof),
+                        nonce=args.nonce, nonce_proof=parse_proof(args.nonce_proof),
+                        root_cert_pem=root_cert_pem, allow_mock=args.allow_mock,
+                        at_document_time=args.at_document_time)
     
     # 결과 출력
     print("\n" + "="*60)
     print("ATTESTATION VERIFICATION RESULT")
     print("="*60)
     
-    print(f"\nValid: {'✓ YES' if result['valid'] else '✗ NO'}")
-    print(f"Real Attestation: {'YES' if result.get('is_real_attestation') else 'NO (mock)'}")
+    print(f"\nValid: {'✓ YES' if result.valid else '✗ NO'}")
+    print(f"Real Attestation: {'YES' if result.is_real_attestation else 'NO (mock)'}")
     
-    if result['pcrs']:
+    pcrs = result.pcrs
+    if pcrs:
         print("\nPCR Values:")
-        for idx, val in sorted(result['pcrs'].items()):
+        for idx, val in sorted(pcrs.items()):
             print(f"  PCR{idx}: {val[:32]}..." if len(str(val)) > 32 else f"  PCR{idx}: {val}")
     
-    if result['checks']:
+    if result.check_codes:
         print("\nChecks:")
-        for check in result['checks']:
+        for check in result.checks:
             print(f"  {check}")
     
-    if result['errors']:
+    if result.error_codes:
         print("\nErrors:")
-        for error in result['errors']:
+        for error in result.errors:
             print(f"  {error}")
     
     print("\n" + "="*60)
     
     # Exit code
-    sys.exit(0 if result['valid'] else 1)
+    sys.exit(0 if result.valid else 1)
 
 if __name__ == '__main__':
     main()
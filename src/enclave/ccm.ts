@@ -55,7 +55,7 @@ import {
   abiEncode,
 } from '../shared/crypto';
 
-import { getAttestationDocument, getSecureRandom, isNsmAvailable } from './nsm';
+import { getAttestationDocumentRaw, getSecureRandom, isNsmAvailable } from './nsm';
 
 // ============================================================================
 // Enclave Configuration
@@ -206,7 +206,7 @@ export class CredibleCommitmentMachine {
     console.log('[CCM] NSM available:', isNsmAvailable());
 
     // NSM에서 실제 attestation document 요청
-    const attestation = await getAttestationDocument({
+    const attestation = await getAttestationDocumentRaw({
       publicKey: Buffer.from(this.state.publicKey.slice(2), 'hex'),
       userData: Buffer.from(JSON.stringify({
         enclaveId: this.state.enclaveId,
@@ -214,6 +214,8 @@ export class CredibleCommitmentMachine {
         version: '1.0.0',
       })),
       nonce: Buffer.from(Date.now().toString()),
+      // 매 RPC마다 같은 public key/user_data이므로 daemon 캐시 document 재사용 허용
+      allowCached: true,
     });
 
     if (!attestation.success) {
@@ -230,7 +232,7 @@ export class CredibleCommitmentMachine {
       : keccak256(Buffer.from('mock-enclave-v1').toString('hex'));
 
     // Attestation document 서명
-    const docBuffer = Buffer.from(attestation.document, 'base64');
+    const docBuffer = attestation.document;
     const docHash = keccak256(docBuffer.toString('hex'));
     const signature = signHash(docHash, this.state.privateKey);
 
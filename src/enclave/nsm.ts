@@ -3,20 +3,73 @@
  * 
  * AWS Nitro Enclave의 NSM과 통신하여 실제 attestation을 생성합니다.
  * Python 스크립트를 통해 NSM API를 호출합니다.
+ *
+ * 기본 경로는 상주 daemon (get_attestation.py --serve)입니다. Unix domain socket으로
+ * 줄 단위 JSON 요청을 보내므로 호출마다 Python 프로세스를 띄우지 않습니다.
+ * NSM_TRANSPORT=stdio 이면 socket 대신 co-process (get_attestation.py --stdio)를
+ * 한 번 spawn 해서 stdin/stdout으로 id가 붙은 NDJSON 요청/응답을 주고받습니다.
+ * daemon/co-process를 기동하거나 연결할 수 없을 때만 one-shot CLI (async execFile)로 fallback 합니다.
+ * 요청이 전달된 뒤의 timeout/연결 끊김은 호출자에게 오류로 올립니다 (같은 요청이 NSM에 두 번 가지 않게).
  */
 
-import { execSync, spawn } from 'child_process';
+import { execFile, spawn, ChildProcess } from 'child_process';
 import * as fs from 'fs';
+import * as net from 'net';
 import * as crypto from 'crypto';
 
 // NSM Python 스크립트 경로
 const NSM_SCRIPT = '/app/scripts/nsm/get_attestation.py';
 const NSM_DEVICE = '/dev/nsm';
+const NSM_SOCKET = process.env.NSM_SOCKET || '/tmp/nsm.sock';
+const NSM_TRANSPORT = process.env.NSM_TRANSPORT || 'socket'; // 'socket' | 'stdio'
+
+// daemon/co-process 공통 옵션
+function daemonOptions(): string[] {
+  const options: string[] = [];
+  if (process.env.NSM_AGGREGATE_WINDOW_MS) {
+    options.push('--aggregate-window-ms', process.env.NSM_AGGREGATE_WINDOW_MS);
+  }
+  if (process.env.NSM_CACHE_MAX_AGE_MS) {
+    options.push('--cache-max-age-ms', process.env.NSM_CACHE_MAX_AGE_MS);
+  }
+  // prefetch는 nonce 없는 요청에만 쓰임 (nonce를 보내는 generateBootAttestation은 해당 없음)
+  if (process.env.NSM_PREFETCH_DEPTH) {
+    options.push('--prefetch-depth', process.env.NSM_PREFETCH_DEPTH);
+  }
+  if (process.env.NSM_ENTROPY_POOL_SIZE) {
+    options.push('--entropy-pool-size', process.env.NSM_ENTROPY_POOL_SIZE);
+  }
+  if (process.env.NSM_MAX_PENDING) {
+    options.push('--max-pending', process.env.NSM_MAX_PENDING);
+  }
+  if (process.env.NSM_METRICS_PORT) {
+    options.push('--metrics-port', process.env.NSM_METRICS_PORT);
+  }
+  return options;
+}
+
+// daemon 기동 대기 (socket 생성까지)
+const DAEMON_STARTUP_TIMEOUT = 5000;
+const DAEMON_POLL_INTERVAL = 50;
 
 export interface AttestationRequest {
   publicKey?: Buffer;     // 포함할 공개키 (최대 1024 bytes)
   userData?: Buffer;      // 사용자 데이터 (최대 512 bytes)
   nonce?: Buffer;         // nonce (최대 512 bytes)
+  allowCached?: boolean;  // daemon 캐시의 이전 document 허용 (nonce 신선도 불필요할 때)
+  maxAgeMs?: number;      // allowCached일 때 허용할 최대 document 나이
+  timings?: boolean;      // 단계별 ns 시간 (NsmTimings) 요청
+}
+
+// get_attestation.py --timings 결과 (요청 안에서 일어난 단계만 포함)
+export interface NsmTimings {
+  import_ns?: number;     // aws_nsm_interface import
+  open_ns?: number;       // 디바이스 open
+  ioctl_ns?: number;      // NSM 호출
+  close_ns?: number;      // 디바이스 close (one-shot만)
+  encode_ns?: number;     // base64/JSON (또는 CBOR) 직렬화
+  script_ns?: number;     // 스크립트 시작부터
+  process_ns?: number;    // Python 프로세스 시작부터
 }
 
 export interface AttestationDocument {
@@ -25,8 +78,30 @@ export interface AttestationDocument {
   pcrs: {
     [key: string]: string; // PCR index -> hex value
   };
+  module_id?: string;     // document payload의 module_id
+  timestamp?: number;     // document payload의 timestamp (ms)
   error?: string;
   mock?: boolean;
+  nonce_root?: string;    // nonce aggregation 시 attest 된 nonce Merkle root
+  nonce_proof?: string[]; // 요청한 nonce의 inclusion proof
+  cached?: boolean;       // daemon 캐시에서 응답했는지
+  prefetched?: boolean;   // daemon이 미리 만들어둔 document인지
+  age_ms?: number;        // 캐시/prefetch 된 document 나이
+  timings?: NsmTimings;
+  expired?: boolean;      // deadline이 지나 daemon이 NSM 호출 전에 버림
+  overloaded?: boolean;   // daemon 대기 요청이 상한을 넘어 바로 거절됨
+}
+
+export interface RawAttestationDocument extends Omit<AttestationDocument, 'document'> {
+  document: Buffer;       // COSE_Sign1 attestation document bytes
+}
+
+export interface MerkleAttestationDocument extends AttestationDocument {
+  root: string;           // user_data에 들어간 Merkle root (0x hex)
+  proofs: {
+    payload: string;      // commitment hash (0x hex)
+    proof: string[];      // MerkleTree.verifyProof()용 inclusion proof
+  }[];
 }
 
 export interface RandomResult {
@@ -40,6 +115,7 @@ export interface RandomResult {
 export interface NsmInfo {
   success: boolean;
   info?: any;
+  cached?: boolean;       // daemon 캐시에서 응답했는지
   error?: string;
   mock?: boolean;
 }
@@ -66,6 +142,476 @@ export function isNsmScriptAvailable(): boolean {
   }
 }
 
+// ============================================================================
+// NSM Daemon
+// ============================================================================
+
+let daemonProcess: ChildProcess | null = null;
+let daemonStarting: Promise<void> | null = null;
+
+function sleep(ms: number): Promise<void> {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+/**
+ * daemon/co-process를 기동하거나 연결하지 못해 요청이 전달되지 않은 경우
+ * (이때만 one-shot CLI로 다시 보내도 안전)
+ */
+class NsmUnavailableError extends Error {
+  constructor(message: string) {
+    super(message);
+    this.name = 'NsmUnavailableError';
+  }
+}
+
+/**
+ * CBOR 디코딩 (daemon의 format: 'cbor' 응답용, definite-length 항목만)
+ */
+function decodeCbor(data: Buffer): any {
+  let offset = 0;
+
+  const readLength = (info: number): number => {
+    let value: number;
+    if (info < 24) return info;
+    if (info === 24) {
+      value = data.readUInt8(offset);
+      offset += 1;
+    } else if (info === 25) {
+      value = data.readUInt16BE(offset);
+      offset += 2;
+    } else if (info === 26) {
+      value = data.readUInt32BE(offset);
+      offset += 4;
+    } else if (info === 27) {
+      value = Number(data.readBigUInt64BE(offset));
+      offset += 8;
+    } else {
+      throw new Error(`Unsupported CBOR length encoding: ${info}`);
+    }
+    return value;
+  };
+
+  const readItem = (): any => {
+    const initial = data.readUInt8(offset++);
+    const major = initial >> 5;
+    const info = initial & 0x1f;
+
+    switch (major) {
+      case 0:
+        return readLength(info);
+      case 1:
+        return -1 - readLength(info);
+      case 2:
+      case 3: {
+        const length = readLength(info);
+        const bytes = data.subarray(offset, offset + length);
+        offset += length;
+        return major === 2 ? bytes : bytes.toString('utf-8');
+      }
+      case 4: {
+        const length = readLength(info);
+        const items: any[] = [];
+        for (let i = 0; i < length; i++) items.push(readItem());
+        return items;
+      }
+      case 5: {
+        const length = readLength(info);
+        const map: { [key: string]: any } = {};
+        for (let i = 0; i < length; i++) {
+          const key = readItem();
+          map[String(key)] = readItem();
+        }
+        return map;
+      }
+      case 7:
+        if (info === 20) return false;
+        if (info === 21) return true;
+        if (info === 22 || info === 23) return null;
+        if (info === 26) {
+          offset += 4;
+          return data.readFloatBE(offset - 4);
+        }
+        if (info === 27) {
+          offset += 8;
+          return data.readDoubleBE(offset - 8);
+        }
+        throw new Error(`Unsupported CBOR simple value: ${info}`);
+      default:
+        throw new Error(`Unsupported CBOR major type: ${major}`);
+    }
+  };
+
+  return readItem();
+}
+
+// 요청에 붙이는 deadline (Unix epoch ms): 이 시각이 지나면 daemon이 NSM 호출 전에 버림
+function withDeadline<T extends object>(request: T, timeout: number): T & { deadline: number } {
+  return { ...request, deadline: Date.now() + timeout };
+}
+
+/**
+ * daemon에 요청 하나 보내고 응답 받기
+ *
+ * format: 'cbor' 요청이면 4-byte 길이 + CBOR 응답 (binary 필드가 Buffer로 옴),
+ * 아니면 JSON 한 줄. daemon이 밀려 있으면 바로 { success: false, overloaded: true }가 옵니다.
+ */
+function sendDaemonRequest(
+  request: { format?: string; [key: string]: any },
+  timeout: number
+): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const socket = net.createConnection(NSM_SOCKET);
+    let received = Buffer.alloc(0);
+    let connected = false;
+
+    socket.setTimeout(timeout, () => {
+      socket.destroy(new Error(`NSM daemon timed out after ${timeout}ms`));
+    });
+
+    socket.on('connect', () => {
+      connected = true;
+      socket.write(JSON.stringify(withDeadline(request, timeout)) + '\n');
+    });
+
+    socket.on('data', (chunk: Buffer) => {
+      received = Buffer.concat([received, chunk]);
+
+      let body: Buffer;
+      if (request.format === 'cbor') {
+        if (received.length < 4) return;
+        const length = received.readUInt32BE(0);
+        if (received.length < 4 + length) return;
+        body = received.subarray(4, 4 + length);
+      } else {
+        const newline = received.indexOf(0x0a);
+        if (newline === -1) return;
+        body = received.subarray(0, newline);
+      }
+
+      socket.end();
+      try {
+        resolve(request.format === 'cbor' ? decodeCbor(body) : JSON.parse(body.toString('utf-8')));
+      } catch (error) {
+        reject(error);
+      }
+    });
+
+    socket.on('error', (error) => {
+      reject(connected ? error : new NsmUnavailableError(error.message));
+    });
+    socket.on('close', () => reject(new Error('NSM daemon closed connection')));
+  });
+}
+
+/**
+ * daemon에 random-stream 요청: JSON header 한 줄 뒤에 raw bytes가 length 만큼 옴
+ */
+function sendDaemonStreamRequest(length: number, timeout: number): Promise<Buffer> {
+  return new Promise((resolve, reject) => {
+    const socket = net.createConnection(NSM_SOCKET);
+    let received = Buffer.alloc(0);
+    let connected = false;
+    let expected = -1;
+
+    socket.setTimeout(timeout, () => {
+      socket.destroy(new Error(`NSM daemon timed out after ${timeout}ms`));
+    });
+
+    socket.on('connect', () => {
+      connected = true;
+      const request = withDeadline({ command: 'random-stream', length }, timeout);
+      socket.write(JSON.stringify(request) + '\n');
+    });
+
+    socket.on('data', (chunk: Buffer) => {
+      received = Buffer.concat([received, chunk]);
+
+      if (expected === -1) {
+        const newline = received.indexOf(0x0a);
+        if (newline === -1) return;
+
+        const header = JSON.parse(received.subarray(0, newline).toString('utf-8'));
+        if (!header.success) {
+          socket.destroy(new Error(header.error || 'Unknown error'));
+          return;
+        }
+        if (header.mock) {
+          console.warn('[NSM] Warning: random-stream is mock (os.urandom):', header.mock_reason);
+        }
+        expected = header.length;
+        received = received.subarray(newline + 1);
+      }
+
+      if (received.length >= expected) {
+        socket.end();
+        resolve(received.subarray(0, expected));
+      }
+    });
+
+    socket.on('error', (error) => {
+      reject(connected ? error : new NsmUnavailableError(error.message));
+    });
+    socket.on('close', () => reject(new Error('NSM daemon closed connection')));
+  });
+}
+
+function canConnectToDaemon(): Promise<boolean> {
+  return new Promise((resolve) => {
+    const socket = net.createConnection(NSM_SOCKET);
+    socket.on('connect', () => {
+      socket.end();
+      resolve(true);
+    });
+    socket.on('error', () => resolve(false));
+  });
+}
+
+/**
+ * daemon이 떠 있는지 확인하고, 없으면 기동
+ */
+async function ensureNsmDaemon(): Promise<void> {
+  if (await canConnectToDaemon()) return;
+
+  if (!daemonStarting) {
+    daemonStarting = (async () => {
+      if (!daemonProcess) {
+        console.log('[NSM] Starting NSM daemon on', NSM_SOCKET);
+        // asyncio daemon: 동시에 들어온 동일 요청을 NSM 호출 하나로 합침
+        const args = [
+          NSM_SCRIPT, '--serve', '--asyncio', '--socket', NSM_SOCKET, ...daemonOptions(),
+        ];
+        const child = spawn('python3', args, {
+          stdio: ['ignore', 'ignore', 'inherit'],
+        });
+        child.unref();
+        child.on('exit', (code) => {
+          console.warn('[NSM] Daemon exited with code', code);
+          if (daemonProcess === child) daemonProcess = null;
+        });
+        daemonProcess = child;
+      }
+
+      const deadline = Date.now() + DAEMON_STARTUP_TIMEOUT;
+      while (Date.now() < deadline) {
+        if (await canConnectToDaemon()) return;
+        if (!daemonProcess) throw new Error('NSM daemon exited during startup');
+        await sleep(DAEMON_POLL_INTERVAL);
+      }
+      throw new Error(`NSM daemon did not start within ${DAEMON_STARTUP_TIMEOUT}ms`);
+    })().finally(() => {
+      daemonStarting = null;
+    });
+  }
+
+  return daemonStarting;
+}
+
+// ============================================================================
+// NSM Co-process (stdio)
+// ============================================================================
+
+interface PendingRequest {
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+let coprocess: ChildProcess | null = null;
+let nextRequestId = 1;
+const pendingRequests = new Map<number, PendingRequest>();
+
+function rejectAllPending(error: Error): void {
+  for (const [id, pending] of pendingRequests) {
+    clearTimeout(pending.timer);
+    pending.reject(error);
+    pendingRequests.delete(id);
+  }
+}
+
+/**
+ * co-process 기동 (이미 떠 있으면 재사용)
+ */
+function getCoprocess(): ChildProcess {
+  if (coprocess) return coprocess;
+
+  console.log('[NSM] Starting NSM co-process (stdio)');
+  const child = spawn('python3', [NSM_SCRIPT, '--stdio', ...daemonOptions()], {
+    stdio: ['pipe', 'pipe', 'inherit'],
+  });
+  let buffer = '';
+
+  child.stdout!.setEncoding('utf-8');
+  child.stdout!.on('data', (chunk: string) => {
+    buffer += chunk;
+    let newline: number;
+    while ((newline = buffer.indexOf('\n')) !== -1) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      if (!line.trim()) continue;
+
+      let response: any;
+      try {
+        response = JSON.parse(line);
+      } catch {
+        console.error('[NSM] Invalid co-process output:', line);
+        continue;
+      }
+
+      const pending = pendingRequests.get(response.id);
+      if (!pending) continue; // 이미 timeout 된 요청
+      pendingRequests.delete(response.id);
+      clearTimeout(pending.timer);
+      pending.resolve(response);
+    }
+  });
+
+  child.on('error', (error) => {
+    // spawn 실패: 요청이 전달되지 않았으므로 one-shot fallback 가능
+    if (coprocess === child) coprocess = null;
+    rejectAllPending(new NsmUnavailableError(error.message));
+  });
+  child.on('exit', (code) => {
+    console.warn('[NSM] Co-process exited with code', code);
+    if (coprocess === child) coprocess = null;
+    rejectAllPending(new Error(`NSM co-process exited with code ${code}`));
+  });
+  child.stdin!.on('error', (error) => {
+    console.error('[NSM] Co-process stdin error:', error.message);
+  });
+
+  // co-process가 Node 종료를 막지 않도록
+  child.unref();
+  (child.stdin as net.Socket).unref();
+  (child.stdout as net.Socket).unref();
+
+  coprocess = child;
+  return child;
+}
+
+/**
+ * co-process에 요청 보내기 (응답은 id로 매칭하므로 순서와 무관)
+ */
+function sendCoprocessRequest(request: object, timeout: number): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const child = getCoprocess();
+    const id = nextRequestId++;
+    const timer = setTimeout(() => {
+      pendingRequests.delete(id);
+      reject(new Error(`NSM co-process timed out after ${timeout}ms`));
+    }, timeout);
+
+    pendingRequests.set(id, { resolve, reject, timer });
+    child.stdin!.write(JSON.stringify({ ...withDeadline(request, timeout), id }) + '\n');
+  });
+}
+
+process.on('exit', () => {
+  daemonProcess?.kill();
+  coprocess?.kill();
+});
+
+/**
+ * daemon 기동/연결 확인 (실패하면 NsmUnavailableError)
+ */
+async function ensureNsmDaemonAvailable(): Promise<void> {
+  try {
+    await ensureNsmDaemon();
+  } catch (error: any) {
+    throw new NsmUnavailableError(error.message);
+  }
+}
+
+/**
+ * daemon에 바로 요청하고, 연결이 안 될 때만 daemon을 기동한 뒤 한 번 더 요청
+ *
+ * 요청마다 연결 확인부터 하면 connect가 두 번 들기 때문에 확인은 실패한 경우에만 합니다.
+ */
+async function withDaemon<T>(send: () => Promise<T>): Promise<T> {
+  try {
+    return await send();
+  } catch (error) {
+    if (!(error instanceof NsmUnavailableError)) throw error;
+  }
+  await ensureNsmDaemonAvailable();
+  return send();
+}
+
+/**
+ * one-shot CLI 실행 (event loop를 막지 않도록 async execFile)
+ */
+function runOneShot(args: string[], timeout: number, input?: string): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const child = execFile(
+      'python3',
+      [NSM_SCRIPT, ...args],
+      { encoding: 'utf-8', timeout, maxBuffer: 64 * 1024 * 1024 },
+      (error, stdout) => {
+        if (error) {
+          reject(error.killed ? new Error(`NSM one-shot script timed out after ${timeout}ms`) : error);
+          return;
+        }
+        try {
+          resolve(JSON.parse(stdout));
+        } catch (parseError) {
+          reject(parseError);
+        }
+      }
+    );
+    child.stdin!.on('error', () => {}); // 스크립트가 stdin을 읽기 전에 끝난 경우
+    child.stdin!.end(input);
+  });
+}
+
+/**
+ * NSM 요청 실행: daemon 우선, daemon/co-process를 쓸 수 없을 때만 one-shot CLI
+ */
+async function callNsm(
+  request: { command: string; [key: string]: any },
+  timeout: number
+): Promise<any> {
+  try {
+    if (NSM_TRANSPORT === 'stdio') {
+      return await sendCoprocessRequest(request, timeout);
+    }
+    return await withDaemon(() => sendDaemonRequest(request, timeout));
+  } catch (error: any) {
+    // 이미 전달된 요청의 timeout 등은 재시도하지 않고 호출자에게 전달
+    if (!(error instanceof NsmUnavailableError)) throw error;
+    console.warn('[NSM] Daemon unavailable, falling back to one-shot script:', error.message);
+  }
+
+  // one-shot CLI (디버깅용 경로)
+  const args = ['--command', request.command];
+  if (request.public_key) args.push('--public-key', request.public_key);
+  if (request.user_data) args.push('--user-data', request.user_data);
+  if (request.nonce) args.push('--nonce', request.nonce);
+  if (request.length !== undefined) args.push('--length', String(request.length));
+  if (request.refresh) args.push('--refresh');
+  if (request.timings) args.push('--timings');
+
+  // attestation-batch 항목 / attestation-merkle payload는 stdin으로 전달
+  return runOneShot(
+    args,
+    timeout,
+    request.items || request.payloads ? JSON.stringify(request.items || request.payloads) : undefined
+  );
+}
+
+// ============================================================================
+// NSM API
+// ============================================================================
+
+function toAttestationParams(request: AttestationRequest) {
+  return {
+    public_key: request.publicKey?.toString('base64'),
+    user_data: request.userData?.toString('utf-8'),
+    nonce: request.nonce?.toString('base64'),
+    allow_cached: request.allowCached,
+    max_age_ms: request.maxAgeMs,
+    timings: request.timings,
+  };
+}
+
 /**
  * NSM에서 Attestation Document 가져오기
  */
@@ -80,28 +626,10 @@ export async function getAttestationDocument(
   }
   
   try {
-    // Python 스크립트 인자 구성
-    const args = ['--command', 'attestation'];
-    
-    if (request.publicKey) {
-      args.push('--public-key', request.publicKey.toString('base64'));
-    }
-    
-    if (request.userData) {
-      args.push('--user-data', request.userData.toString('utf-8'));
-    }
-    
-    if (request.nonce) {
-      args.push('--nonce', request.nonce.toString('base64'));
-    }
-    
-    // Python 스크립트 실행
-    const result = execSync(`python3 ${NSM_SCRIPT} ${args.join(' ')}`, {
-      encoding: 'utf-8',
-      timeout: 10000,
-    });
-    
-    const parsed = JSON.parse(result);
+    const parsed: AttestationDocument = await callNsm(
+      { command: 'attestation', ...toAttestationParams(request) },
+      10000
+    );
     
     console.log('[NSM] Attestation document generated:', parsed.success ? 'SUCCESS' : 'FAILED');
     if (parsed.mock) {
@@ -121,6 +649,113 @@ export async function getAttestationDocument(
   }
 }
 
+/**
+ * NSM에서 Attestation Document를 bytes로 가져오기
+ *
+ * socket daemon에는 format: 'cbor'로 요청해서 document를 base64 없이 그대로 받습니다.
+ * daemon을 쓸 수 없으면 getAttestationDocument() 결과를 디코딩합니다.
+ */
+export async function getAttestationDocumentRaw(
+  request: AttestationRequest = {}
+): Promise<RawAttestationDocument> {
+  if (isNsmScriptAvailable() && NSM_TRANSPORT === 'socket') {
+    try {
+      const parsed: RawAttestationDocument = await withDaemon(() => sendDaemonRequest(
+        { command: 'attestation', ...toAttestationParams(request), format: 'cbor' },
+        10000
+      ));
+
+      console.log('[NSM] Attestation document generated:', parsed.success ? 'SUCCESS' : 'FAILED');
+      if (parsed.mock) {
+        console.log('[NSM] Warning: Running in mock mode (not in real Enclave)');
+      }
+      return { ...parsed, document: parsed.document || Buffer.alloc(0) };
+
+    } catch (error: any) {
+      if (!(error instanceof NsmUnavailableError)) {
+        console.error('[NSM] Failed to get raw attestation:', error.message);
+        return { success: false, document: Buffer.alloc(0), pcrs: {}, error: error.message };
+      }
+      console.warn('[NSM] Daemon unavailable for raw attestation:', error.message);
+    }
+  }
+
+  const attestation = await getAttestationDocument(request);
+  return { ...attestation, document: Buffer.from(attestation.document, 'base64') };
+}
+
+/**
+ * 여러 Attestation Document를 요청 한 번으로 가져오기
+ *
+ * 항목별 실패는 해당 결과에만 success: false 로 표시됩니다.
+ */
+export async function getAttestationDocumentBatch(
+  requests: AttestationRequest[]
+): Promise<AttestationDocument[]> {
+  if (!isNsmScriptAvailable()) {
+    console.log('[NSM] Script not found, returning mock attestations');
+    return requests.map(getMockAttestation);
+  }
+
+  try {
+    const parsed = await callNsm(
+      { command: 'attestation-batch', items: requests.map(toAttestationParams) },
+      10000 + requests.length * 1000
+    );
+
+    if (!parsed.success) {
+      throw new Error(parsed.error || 'Unknown error');
+    }
+    if (parsed.failed > 0) {
+      console.warn(`[NSM] Batch attestation: ${parsed.failed}/${parsed.count} items failed`);
+    }
+
+    return parsed.results;
+
+  } catch (error: any) {
+    console.error('[NSM] Failed to get batch attestation:', error.message);
+    return requests.map(() => ({
+      success: false,
+      document: '',
+      pcrs: {},
+      error: error.message,
+    }));
+  }
+}
+
+/**
+ * commitment hash 여러 개를 Merkle root로 묶어 attestation 한 번으로 증명
+ *
+ * 결과의 proofs[i]는 commitments[i]의 inclusion proof이며 모두 같은 document를 공유합니다.
+ */
+export async function getMerkleAttestation(
+  commitments: string[],
+  request: Omit<AttestationRequest, 'userData'> = {}
+): Promise<MerkleAttestationDocument> {
+  try {
+    const parsed: MerkleAttestationDocument = await callNsm(
+      { command: 'attestation-merkle', payloads: commitments, ...toAttestationParams(request) },
+      10000
+    );
+
+    if (!parsed.success) {
+      throw new Error(parsed.error || 'Unknown error');
+    }
+    return parsed;
+
+  } catch (error: any) {
+    console.error('[NSM] Failed to get Merkle attestation:', error.message);
+    return {
+      success: false,
+      document: '',
+      pcrs: {},
+      error: error.message,
+      root: '',
+      proofs: [],
+    };
+  }
+}
+
 /**
  * NSM에서 Secure Random 가져오기
  */
@@ -131,12 +766,7 @@ export async function getSecureRandom(length: number = 32): Promise<Buffer> {
   }
   
   try {
-    const result = execSync(
-      `python3 ${NSM_SCRIPT} --command random --length ${length}`,
-      { encoding: 'utf-8', timeout: 5000 }
-    );
-    
-    const parsed: RandomResult = JSON.parse(result);
+    const parsed: RandomResult = await callNsm({ command: 'random', length }, 5000);
     
     if (parsed.success && parsed.random) {
       return Buffer.from(parsed.random, 'base64');
@@ -150,10 +780,31 @@ export async function getSecureRandom(length: number = 32): Promise<Buffer> {
   }
 }
 
+/**
+ * NSM에서 대용량 Secure Random 가져오기 (key 생성 batch seed 용)
+ *
+ * daemon의 random-stream을 사용하므로 NSM 1회 최대 크기 제한이 없고 base64 overhead도 없습니다.
+ * socket daemon을 쓸 수 없으면 crypto.randomBytes로 대체합니다.
+ */
+export async function getSecureRandomBulk(length: number): Promise<Buffer> {
+  if (!isNsmScriptAvailable() || NSM_TRANSPORT !== 'socket') {
+    console.log('[NSM] Bulk random needs the socket daemon, using crypto.randomBytes');
+    return crypto.randomBytes(length);
+  }
+
+  try {
+    const timeout = 5000 + Math.ceil(length / 65536) * 1000;
+    return await withDaemon(() => sendDaemonStreamRequest(length, timeout));
+  } catch (error: any) {
+    console.error('[NSM] Failed to get bulk random, using crypto:', error.message);
+    return crypto.randomBytes(length);
+  }
+}
+
 /**
  * NSM 정보 조회
  */
-export async function describeNsm(): Promise<NsmInfo> {
+export async function describeNsm(refresh: boolean = false): Promise<NsmInfo> {
   if (!isNsmScriptAvailable()) {
     return {
       success: false,
@@ -163,12 +814,7 @@ export async function describeNsm(): Promise<NsmInfo> {
   }
   
   try {
-    const result = execSync(
-      `python3 ${NSM_SCRIPT} --command describe`,
-      { encoding: 'utf-8', timeout: 5000 }
-    );
-    
-    return JSON.parse(result);
+    return await callNsm({ command: 'describe', refresh }, 5000);
     
   } catch (error: any) {
     return {
@@ -178,6 +824,31 @@ export async function describeNsm(): Promise<NsmInfo> {
   }
 }
 
+/**
+ * NSM daemon metrics (Prometheus text format)
+ *
+ * daemon/co-process 안에서 집계한 값이라 one-shot CLI로는 얻을 수 없으므로 실패하면 null입니다.
+ * NSM_METRICS_PORT를 주면 daemon이 127.0.0.1:<port>/metrics 로도 직접 노출합니다.
+ */
+export async function getNsmMetrics(): Promise<string | null> {
+  if (!isNsmScriptAvailable()) {
+    return null;
+  }
+
+  try {
+    let result;
+    if (NSM_TRANSPORT === 'stdio') {
+      result = await sendCoprocessRequest({ command: 'metrics' }, 5000);
+    } else {
+      result = await withDaemon(() => sendDaemonRequest({ command: 'metrics' }, 5000));
+    }
+    return result.success ? result.metrics : null;
+  } catch (error: any) {
+    console.warn('[NSM] Failed to get metrics:', error.message);
+    return null;
+  }
+}
+
 /**
  * Mock Attestation (NSM 없을 때)
  */